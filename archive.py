@@ -0,0 +1,376 @@
+import argparse
+import gzip
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from extractors import get_extractor
+from sink import DailyDataSink
+from writer import close_writer
+from config import ARCHIVE_PATH, ARCHIVE_RETENTION_DAYS, ARCHIVE_SEGMENT_PAGES, EXTRACTOR, LOG_LEVEL, SINK_BATCH_SIZE
+
+"""
+compressed archive of the raw responses of the REWE website.
+Every scraper writes the raw HTML of the pages it requests to append-only segments in the style of WARC files
+(data/archive/<date>/<store>-<run>-<segment>.warc.gz). Every record is its own gzip member, so a segment stays readable
+up to its last complete record even if the run is killed while writing. The records are compressed and written by a
+background thread, which only holds back the fetch threads if the disk falls behind by more than two segments.
+Days older than ARCHIVE_RETENTION_DAYS are deleted at the start of every run.
+
+Pages the server answered with 304 "Not Modified" are archived as revisit records, which refer to the earlier response
+with the same content hash (see page_cache.py) instead of repeating its HTML.
+
+The archive of a day can be extracted again without sending a single request, e.g. after a fix to an extractor:
+python archive.py reextract 2025-05-01 [--extractor lxml] [--processes N] [--dry-run]
+"""
+
+WARC_VERSION = b"WARC/1.1"
+NOT_MODIFIED_PROFILE = "http://netpreserve.org/warc/1.1/revisit/server-not-modified"
+
+
+class HtmlArchive:
+    """
+    writes the raw responses of a single scraper to the archive segments of the current run.
+
+    Args:
+    path: the folder of the archive.
+    today: the date of the run. Every day gets its own subfolder.
+    store_slug: the file system friendly name of the store location, used for the names of the segments.
+    logger: the logger of the Application the scraper belongs to.
+    segment_pages: the amount of pages after which a new segment is started.
+    retention_days: the amount of days the archive is kept, None to keep all days.
+    """
+
+    def __init__(self, path, today, store_slug, logger, segment_pages=ARCHIVE_SEGMENT_PAGES, retention_days=ARCHIVE_RETENTION_DAYS):
+        if retention_days is not None:
+            remove_expired_days(path, today, retention_days)
+        self.folder = os.path.join(path, today.isoformat())
+        os.makedirs(self.folder, exist_ok=True)
+        self.prefix = f"{store_slug}-{datetime.now().strftime('%H%M%S')}-{os.getpid()}"
+        self.logger = logger
+        self.segment_pages = segment_pages
+        self.segment = 0
+        self.pages = 0
+        self.file = None
+        self.queue = queue.Queue(segment_pages * 2) # bounded, so the raw HTML never piles up in memory if the disk is slow
+        self.writer = threading.Thread(target=self.write_records, name=f"archive-{store_slug}", daemon=True)
+        self.writer.start()
+
+
+    def add(self, url, store, category, page, content, digest=None):
+        """
+        queues the raw content of a response for the background writer. Only waits if the queue is full.
+
+        Args:
+        url: the requested URL.
+        store, category, page: the store location, category name and page number the response belongs to.
+        content: the raw body of the response as bytes.
+        digest: the content hash of the page (see page_cache.py), which revisit records refer to.
+        """
+
+        self.queue.put(("response", url, store, category, page, content, digest, datetime.now(timezone.utc)))
+
+
+    def add_revisit(self, url, store, category, page, digest):
+        """
+        queues a revisit record for a page the server answered with 304 "Not Modified". Only waits if the queue is full.
+
+        Args:
+        url, store, category, page: see add.
+        digest: the content hash of the cached page, which identifies the earlier response with the same content.
+        """
+
+        self.queue.put(("revisit", url, store, category, page, b"", digest, datetime.now(timezone.utc)))
+
+
+    def write_records(self):
+        """
+        runs in the background thread and writes the queued responses until close is called.
+        """
+
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                self.write_record(*record)
+            except OSError as e:
+                self.logger.error(f"could not archive {record[1]}: {e}")
+        if self.file:
+            self.file.close()
+
+
+    def write_record(self, record_type, url, store, category, page, content, digest, fetched_at):
+        if self.file is None or self.pages >= self.segment_pages:
+            if self.file:
+                self.file.close()
+            self.segment += 1
+            self.pages = 0
+            self.file = open(os.path.join(self.folder, f"{self.prefix}-{self.segment:05d}.warc.gz"), "ab")
+
+        headers = {
+            "WARC-Type": record_type,
+            "WARC-Record-ID": f"<urn:uuid:{uuid.uuid4()}>",
+            "WARC-Date": fetched_at.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "WARC-Target-URI": url,
+        }
+        if record_type == "revisit":
+            headers["WARC-Profile"] = NOT_MODIFIED_PROFILE
+        else:
+            headers["Content-Type"] = "text/html; charset=utf-8"
+        headers.update({"Bazaar-Store": store, "Bazaar-Category": category, "Bazaar-Page": str(page)})
+        if digest:
+            headers["Bazaar-Digest"] = digest
+        headers["Content-Length"] = str(len(content))
+        head = b"\r\n".join([WARC_VERSION] + [f"{key}: {value}".encode("utf-8") for key, value in headers.items()])
+        self.file.write(gzip.compress(head + b"\r\n\r\n" + content + b"\r\n\r\n"))
+        self.file.flush()
+        self.pages += 1
+
+
+    def close(self):
+        """
+        writes all queued responses and closes the current segment.
+        """
+
+        self.queue.put(None)
+        self.writer.join()
+
+
+def remove_expired_days(path, today, retention_days):
+    """
+    deletes the folders of the days that are older than the given amount of days.
+    """
+
+    if not os.path.isdir(path):
+        return
+    for folder in Path(path).iterdir():
+        try:
+            day = date.fromisoformat(folder.name)
+        except ValueError:
+            continue
+        if folder.is_dir() and day < today - timedelta(days=retention_days):
+            shutil.rmtree(folder, ignore_errors=True) # another worker process may be deleting the same folder
+
+
+def can_revisit(archived, today, retention_days=ARCHIVE_RETENTION_DAYS):
+    """
+    checks whether a page that wasn't modified may be archived as a reference to the response archived on the given day,
+    or whether it has to be requested in full again, so the referenced response isn't deleted before the reference.
+
+    Args:
+    archived: the date the last full response of the page was archived on, None if it never was.
+    today: the date of the run.
+    retention_days: the amount of days the archive is kept, None to keep all days.
+    """
+
+    if archived is None:
+        return False
+    return retention_days is None or (today - archived).days < max(1, retention_days // 2)
+
+
+def read_segment(path):
+    """
+    reads the records of an archive segment. A record that was cut off at the end of the segment is skipped.
+
+    Output:
+    yields a tuple of the headers (as a dictionary) and the raw content of every record.
+    """
+
+    with gzip.open(path, "rb") as file:
+        while True:
+            try:
+                version = file.readline()
+                if not version:
+                    return
+                if version.rstrip() != WARC_VERSION:
+                    raise ValueError(f"{path} is not an archive segment")
+                headers = {}
+                for line in iter(file.readline, b"\r\n"):
+                    if not line:
+                        return
+                    key, _, value = line.decode("utf-8").partition(":")
+                    headers[key.strip()] = value.strip()
+                content = file.read(int(headers["Content-Length"]))
+                file.read(4)
+            except (EOFError, gzip.BadGzipFile):
+                return
+            if len(content) < int(headers["Content-Length"]):
+                return
+            yield headers, content
+
+
+def extract_segment(path, extractor_name):
+    """
+    extracts the products of every page in an archive segment. Runs inside the worker processes of reextract.
+
+    Output:
+    a list of tuples of the store, category, page, fetch time, ProductBuffer, last page and content hash of every record.
+    The products and last page of revisit records are None, they are resolved by extract_revisits.
+    """
+
+    extractor = get_extractor(extractor_name)
+    day = date.fromisoformat(Path(path).parent.name)
+    results = []
+    for headers, content in read_segment(path):
+        store, category, page = headers["Bazaar-Store"], headers["Bazaar-Category"], int(headers["Bazaar-Page"])
+        if headers["WARC-Type"] == "revisit":
+            products, last_page = None, None
+        else:
+            products, last_page = extractor.extract(content, day, store, category, page)
+        results.append((store, category, page, headers["WARC-Date"], products, last_page, headers.get("Bazaar-Digest")))
+    return results
+
+
+def extract_revisits(path, extractor_name, day, revisits):
+    """
+    extracts the responses of an archive segment that revisit records refer to. Runs inside the worker processes of reextract.
+
+    Args:
+    path: the archive segment, which may belong to an earlier day than the revisit records.
+    day: the date of the revisit records, which the products are labeled with.
+    revisits: a dictionary of the content hashes to be resolved and the store, category and page of their revisit records.
+
+    Output:
+    a list of tuples of the content hash, store, category, page, ProductBuffer and last page of every resolved revisit record.
+    """
+
+    extractor = get_extractor(extractor_name)
+    results = []
+    for headers, content in read_segment(path):
+        digest = headers.get("Bazaar-Digest")
+        if headers["WARC-Type"] != "response" or digest not in revisits:
+            continue
+        for store, category, page in revisits.pop(digest):
+            products, last_page = extractor.extract(content, day, store, category, page)
+            results.append((digest, store, category, page, products, last_page))
+        if not revisits:
+            break
+    return results
+
+
+def resolve_revisits(day, revisits, extractor_name, executor, path):
+    """
+    looks up the responses the revisit records of a day refer to, starting with the day itself and going back one day at a time
+    until every content hash is found.
+
+    Args:
+    day: the date of the revisit records.
+    revisits: a dictionary of content hashes and the store, category and page of their revisit records.
+    extractor_name, executor, path: see reextract.
+
+    Output:
+    a dictionary of the store, category and page of every resolved revisit record and its ProductBuffer and last page.
+    """
+
+    days = sorted((folder for folder in Path(path).iterdir() if folder.is_dir() and folder.name <= day.isoformat()), reverse=True)
+    resolved = {}
+    for folder in days:
+        if not revisits:
+            break
+        futures = [executor.submit(extract_revisits, str(segment), extractor_name, day, revisits) for segment in sorted(folder.glob("*.warc.gz"))]
+        for future in as_completed(futures):
+            for digest, store, category, page, products, last_page in future.result():
+                revisits.pop(digest, None)
+                resolved[(store, category, page)] = (products, last_page)
+    return resolved
+
+
+def reextract(day, extractor_name=EXTRACTOR, processes=None, dry_run=False, path=ARCHIVE_PATH):
+    """
+    extracts the products of all pages archived on the given day again, spread over all cores, and upserts them into
+    the DailyData table. If a page was archived several times, the latest response is used. Pages beyond the last page
+    of their category (requested speculatively) are left out, just like during the scrape. Pages that weren't modified are
+    extracted from the earlier response their revisit record refers to, which may be archived on an earlier day.
+
+    Args:
+    day: the date of the archive to be extracted.
+    extractor_name: the extractor to be used, as listed in the EXTRACTORS dictionary of extractors.py.
+    processes: the amount of worker processes, defaults to the amount of cores.
+    dry_run: only counts the products instead of writing them to the database.
+
+    Output:
+    a dictionary with the amount of products found for every store.
+    """
+
+    segments = sorted(Path(path, day.isoformat()).glob("*.warc.gz"))
+    if not segments:
+        raise FileNotFoundError(f"no archive segments found for {day}")
+
+    pages = {} # holds the latest response of every page for each store and category
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(extract_segment, str(segment), extractor_name) for segment in segments]
+        for future in as_completed(futures):
+            for store, category, page, fetched_at, products, last_page, digest in future.result():
+                category_pages = pages.setdefault(store, {}).setdefault(category, {})
+                if page not in category_pages or category_pages[page][0] < fetched_at:
+                    category_pages[page] = (fetched_at, products, last_page, digest)
+
+        ## replaces the revisit records of pages that weren't modified with the products of the responses they refer to
+        revisits = {}
+        for store, categories in pages.items():
+            for category, category_pages in categories.items():
+                for page, (_, products, _, digest) in category_pages.items():
+                    if products is None:
+                        revisits.setdefault(digest, []).append((store, category, page))
+        if revisits:
+            resolved = resolve_revisits(day, dict(revisits), extractor_name, executor, path)
+            for digest, records in revisits.items():
+                for store, category, page in records:
+                    category_pages = pages[store][category]
+                    if (store, category, page) in resolved:
+                        category_pages[page] = (category_pages[page][0], *resolved[(store, category, page)], digest)
+                    else:
+                        logging.getLogger("archive").warning("page %s of %s in %s wasn't modified, but its earlier response isn't archived", page, category, store)
+                        del category_pages[page]
+
+    found = {}
+    for store, categories in pages.items():
+        sink = None if dry_run else DailyDataSink(logging.getLogger("archive"), SINK_BATCH_SIZE)
+        found[store] = 0
+        for category, category_pages in categories.items():
+            if not category_pages:
+                continue
+            last_page = category_pages[1][2] if 1 in category_pages else max(category_pages)
+            for page in sorted(category_pages):
+                if page > last_page:
+                    continue
+                products = category_pages[page][1]
+                found[store] += len(products)
+                if sink:
+                    sink.add(products)
+        if sink:
+            sink.close()
+    close_writer()
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tools for the archive of raw responses")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reextraction = subparsers.add_parser("reextract", help="extract the products of an archived day again and upsert them into the database")
+    reextraction.add_argument("date", type=date.fromisoformat, help="the date of the archive, e.g. 2025-05-01")
+    reextraction.add_argument("--extractor", default=EXTRACTOR, help="the extractor to be used (see extractors.py)")
+    reextraction.add_argument("--processes", type=int, default=None, help="amount of worker processes, defaults to the amount of cores")
+    reextraction.add_argument("--dry-run", action="store_true", help="only count the products, don't write them to the database")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s: %(message)s", datefmt="%Y.%m.%d %H:%M:%S")
+    try:
+        found = reextract(args.date, args.extractor, args.processes, args.dry_run)
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+    for store, products in found.items():
+        print(f"{store}: {products} products")
+
+
+if __name__ == "__main__":
+    main()
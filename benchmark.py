@@ -0,0 +1,425 @@
+import argparse
+import logging
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+import grammage
+import http_utils
+import scraper
+from extractors import EXTRACTORS, get_extractor
+from fixture_server import GRAMMAGES, FixturePages, FixtureServer, synthetic_page
+from product_buffer import ProductBuffer
+from summaries import PriceSummary
+
+"""
+benchmarks for the performance critical parts of Bazaar that can run offline, without sending requests to the REWE website.
+Every benchmark checks that the compared implementations produce the same results before measuring them.
+
+usage:
+python benchmark.py extractors [--html-dir DIR] [--pages N] [--repeat N]
+python benchmark.py grammage [--corpus FILE] [--size N]
+python benchmark.py buffer [--products N] [--repeat N]
+python benchmark.py summaries [--days N] [--categories N] [--products N] [--repeat N]
+python benchmark.py scraper [--stores N] [--categories N] [--pages N] [--latency S] [--error-rate P] [--reset-rate P] [--rate N] [--runs N]
+"""
+
+def load_pages(html_dir, pages):
+    """
+    loads the HTML files in the given directory, or creates synthetic pages if no directory is given.
+
+    Output:
+    a list of tuples of the page number and the HTML of the page.
+    """
+
+    if html_dir:
+        files = sorted(Path(html_dir).glob("*.html"))[:pages]
+        if not files:
+            sys.exit(f"no HTML files found in {html_dir}")
+        return [(1, file.read_text(encoding="utf-8")) for file in files]
+    return [(page, synthetic_page(page, pages)) for page in range(1, pages + 1)]
+
+
+def benchmark_extractors(args):
+    """
+    checks that every extractor returns the same products as the BeautifulSoup reference extractor
+    and measures the amount of products per second each extractor can extract.
+    """
+
+    pages = load_pages(args.html_dir, args.pages)
+    today = date.today()
+    reference = EXTRACTORS["bs4"]()
+    expected = [reference.extract(html, today, "store", "category", page) for page, html in pages]
+    products_total = sum(len(products) for products, _ in expected)
+    print(f"{len(pages)} pages, {products_total} products")
+
+    failed = False
+    for name, extractor_class in EXTRACTORS.items():
+        extractor = extractor_class()
+
+        ## parity check against the reference extractor
+        for (page, html), expected_result in zip(pages, expected):
+            result = extractor.extract(html, today, "store", "category", page)
+            if result != expected_result:
+                failed = True
+                mismatches = [(a, b) for a, b in zip(result[0], expected_result[0]) if a != b]
+                print(f"{name}: result differs from bs4 on page {page} "
+                      f"(last page {result[1]} vs {expected_result[1]}, {len(result[0])} vs {len(expected_result[0])} products)")
+                for a, b in mismatches[:3]:
+                    print(f"    {a}\n    {b}")
+                break
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for page, html in pages:
+                extractor.extract(html, today, "store", "category", page)
+        seconds = time.perf_counter() - start
+        print(f"{name:>6}: {round(products_total * args.repeat / seconds):>8} products/s "
+              f"({round(seconds / (len(pages) * args.repeat) * 1000, 2)} ms per page)")
+
+    return 1 if failed else 0
+
+
+def reference_parse_amount(amount):
+    """
+    the per-product grammage parser as it was used before grammage.py, kept as the baseline for the grammage benchmark.
+    """
+
+    amount_cleaned = re.sub(r"""[\"']|\(.*?\)""", "", amount).strip()
+    amount_cleaned = re.sub(r"\s+", "", amount_cleaned)
+    listed_amount = None
+    listed_unit = None
+    units = ["g", "ml", "kg", "l"]
+    
+    for unit in units:
+        try:
+            search_unit = re.search(rf"(\d+)(?={unit})", amount_cleaned)
+            if search_unit:
+                if "," in amount_cleaned:
+                    listed_amount = re.search(r"\d+(\,\d+)?", amount_cleaned)
+                    listed_amount = float(listed_amount.group().replace(",", "."))
+                else:
+                    listed_amount = float(search_unit.group(1))
+                listed_unit = unit
+        except (AttributeError, ValueError):
+            pass
+
+    if not listed_amount:
+        listed_amount = 1.0
+        listed_unit = "piece"
+        
+    try:
+        multiplier = re.search(r"\d+(?=x)", amount_cleaned).group()
+        if multiplier:
+            listed_amount = float(multiplier) * float(listed_amount)
+    except (AttributeError, ValueError):
+        pass
+
+    return listed_amount, listed_unit
+
+
+def grammage_corpus(corpus_file, size):
+    """
+    loads a corpus of grammage strings (one per line) or creates a synthetic one in which, like on the REWE website,
+    a few hundred distinct grammages make up most of the products.
+    """
+
+    if corpus_file:
+        return Path(corpus_file).read_text(encoding="utf-8").splitlines()
+    
+    rng = random.Random(0)
+    distinct = GRAMMAGES + [f"{rng.choice([1, 2, 4, 6, 10, 12])}x{rng.randint(1, 500)}{rng.choice(['g', 'ml'])}" for _ in range(100)] \
+                         + [f"{rng.randint(1, 1000)}{rng.choice(['g', 'ml', 'kg', 'l', ' Stück'])}" for _ in range(300)]
+    weights = [1 / (rank + 1) for rank in range(len(distinct))]
+    return rng.choices(distinct, weights=weights, k=size)
+
+
+def benchmark_grammage(args):
+    """
+    checks that the cached and the vectorized grammage parsers of grammage.py return the same amounts and units
+    as the previous per-product parser and compares how long each of them takes for the whole corpus.
+    """
+
+    corpus = grammage_corpus(args.corpus, args.size)
+    print(f"{len(corpus)} grammages, {len(set(corpus))} distinct")
+
+    timings = {}
+    start = time.perf_counter()
+    expected = [reference_parse_amount(amount) for amount in corpus]
+    timings["reference"] = time.perf_counter() - start
+
+    grammage.parse_amount.cache_clear()
+    start = time.perf_counter()
+    cached = [grammage.parse_amount(amount) for amount in corpus]
+    timings["cached"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = grammage.parse_amounts(corpus)
+    timings["vectorized"] = time.perf_counter() - start
+    vectorized = list(zip(vectorized["listed_amount"].tolist(), vectorized["listed_unit"].tolist()))
+
+    failed = False
+    for name, result in (("cached", cached), ("vectorized", vectorized)):
+        mismatches = [(amount, a, b) for amount, a, b in zip(corpus, result, expected) if a != b]
+        if mismatches:
+            failed = True
+            print(f"{name}: {len(mismatches)} results differ from the reference parser, e.g. {mismatches[:3]}")
+
+    for name, seconds in timings.items():
+        print(f"{name:>10}: {round(seconds * 1000, 1):>8} ms ({round(timings['reference'] / seconds, 1)}x)")
+
+    return 1 if failed else 0
+
+
+def synthetic_products(size):
+    """
+    creates the data points of the given amount of products, in the order of the arguments of ProductBuffer.append.
+    """
+
+    rng = random.Random(0)
+    units = ["g", "ml", "kg", "l", "piece"]
+    return [(1_000_000 + i, f"REWE Beste Wahl Produkt {i}", rng.random() < 0.15, round(rng.uniform(0.2, 30), 2),
+             float(rng.randint(1, 1000)), rng.choice(units), rng.random() < 0.2) for i in range(size)]
+
+
+def build_dicts(rows, today):
+    """
+    stores the products one dictionary per product, the way the extractors did before product_buffer.py.
+    """
+
+    return [{"date": today, "store_id": "store", "product_id": product_id, "product_name": name, "has_bio_label": bio,
+             "category_id": "category", "listed_price": price, "listed_amount": amount, "listed_unit": unit, "is_on_offer": offer}
+            for product_id, name, bio, price, amount, unit, offer in rows]
+
+
+def build_buffer(rows, today):
+    buffer = ProductBuffer(today, "store", "category")
+    for row in rows:
+        buffer.append(*row)
+    return buffer
+
+
+def measure_memory(build, rows, today):
+    """
+    returns the amount of bytes allocated by the product storage created by the given function.
+    """
+
+    tracemalloc.start()
+    products = build(rows, today)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del products
+    return size
+
+
+def benchmark_buffer(args):
+    """
+    checks that the columnar ProductBuffer turns into the same dataframe and records as a list of product dictionaries and
+    compares the memory usage and the time needed to store the products and convert them to a dataframe and back to records.
+    """
+
+    today = date.today()
+    rows = synthetic_products(args.products)
+    dicts = build_dicts(rows, today)
+    buffer = build_buffer(rows, today)
+
+    failed = False
+    try:
+        pd.testing.assert_frame_equal(buffer.to_dataframe(), pd.DataFrame(dicts))
+    except AssertionError as e:
+        failed = True
+        print(f"buffer: dataframe differs from the dataframe of the dictionaries: {e}")
+    if list(buffer.records()) != dicts:
+        failed = True
+        print("buffer: records differ from the dictionaries")
+
+    print(f"{args.products} products")
+    pipelines = {
+        "dicts": lambda: pd.DataFrame(build_dicts(rows, today)).to_dict(orient="records"),
+        "buffer": lambda: build_buffer(rows, today).to_dataframe().to_dict(orient="records"),
+    }
+    memory = {"dicts": measure_memory(build_dicts, rows, today), "buffer": measure_memory(build_buffer, rows, today)}
+    for name, pipeline in pipelines.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pipeline()
+        seconds = (time.perf_counter() - start) / args.repeat
+        print(f"{name:>6}: {round(memory[name] / 1024 / 1024, 2):>6} MB ({round(memory['dicts'] / memory[name], 1)}x), "
+              f"{round(seconds * 1000, 1):>7} ms to store, convert to a dataframe and back to records")
+
+    return 1 if failed else 0
+
+
+def benchmark_scraper(args):
+    """
+    runs the whole scraper (Application and Scraper) against the local stand-in server of fixture_server.py and reports
+    the pages and products per second, the CPU time of the scraper and its parser processes and the peak memory usage.
+    Checks that every product served has been found. Caches, journals and logs are kept in a temporary folder, 
+    so consecutive runs (--runs) show the effect of the page cache and the pagination history.
+    """
+
+    pages = FixturePages(args.fixtures, args.categories, args.pages)
+    extractor = get_extractor("lxml")
+    expected = sum(len(extractor.extract(html, date.today(), "store", category, page)[0]) for (category, page), html in pages.pages.items())
+    server = FixtureServer(("127.0.0.1", 0), pages, args.latency, args.error_rate, args.reset_rate).start()
+    print(f"{args.stores} stores, {len(pages.pages)} pages and {expected} products per store, served on {server.url}")
+
+    ## points the scraper at the stand-in server. The config values are patched in the modules that imported them
+    overrides = {
+        scraper: {"WEBSITES": [f"{server.url}/c/{category}" for category in pages.categories()], "LOG_LEVEL": logging.WARNING,
+                  "PARALLEL_STORES": args.parallel_stores, "PAGE_CACHE": not args.no_page_cache, "ARCHIVE": args.archive, 
+                  "CHECKPOINTS": False, "STREAMING_SINK": False},
+        http_utils: {"ADAPTIVE_RATE": args.adaptive, "REQUESTS_PER_SECOND": args.rate, "REQUEST_BURST": max(1, int(args.rate)),
+                     "AIMD_MAX_RATE": max(args.rate, http_utils.AIMD_MAX_RATE)},
+    }
+    for module, values in overrides.items():
+        for name, value in values.items():
+            setattr(module, name, value)
+
+    workdir = tempfile.mkdtemp(prefix="bazaar-benchmark-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    failed = False
+    try:
+        for run in range(1, args.runs + 1):
+            before = server.counters.copy()
+            usage_before = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+            start = time.perf_counter()
+
+            application = scraper.Application(store_locations={f"store {i}": f"cookie-{i}" for i in range(1, args.stores + 1)})
+            for _ in application.run_scrapers():
+                pass
+            scraper.close_writer()
+
+            seconds = time.perf_counter() - start
+            usage_after = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = sum(after.ru_utime + after.ru_stime - before_.ru_utime - before_.ru_stime for before_, after in zip(usage_before, usage_after))
+            peak_rss = max(usage.ru_maxrss for usage in usage_after) / 1024 # ru_maxrss is in KB on Linux
+            served = {counter: value - before[counter] for counter, value in server.counters.items()}
+            fetched = application.stage_stats["fetch"].pages
+
+            print(f"run {run}: {fetched} pages and {application.total_items} products in {round(seconds, 2)} seconds, "
+                  f"{round(fetched / seconds, 1)} pages/s, {round(application.total_items / seconds)} products/s, "
+                  f"CPU {round(cpu, 2)} seconds, peak RSS {round(peak_rss, 1)} MB")
+            print(f"       server: {served['requests']} requests, {served['pages']} pages, {served['not_modified']} not modified, "
+                  f"{served['errors']} 429 responses, {served['resets']} dropped connections")
+
+            if application.failed_stores or application.total_items != expected * args.stores:
+                failed = True
+                print(f"       expected {expected * args.stores} products, failed stores: {application.failed_stores or 'none'}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.shutdown()
+
+    return 1 if failed else 0
+
+
+def benchmark_summaries(args):
+    """
+    checks that merging the price summaries of summaries.py gives the same counts and moments as the raw prices
+    and quantiles within the error bound of the sketches, and measures how long it takes to merge them.
+    """
+
+    rng = random.Random(0)
+    frames = []
+    for day in range(args.days):
+        for category in range(args.categories):
+            size = rng.randint(50, 2 * args.products)
+            frames.append(pd.DataFrame({
+                "listed_price": [round(rng.lognormvariate(1, 0.8), 2) for _ in range(size)],
+                "has_bio_label": [rng.random() < 0.15 for _ in range(size)],
+                "is_on_offer": [rng.random() < 0.2 for _ in range(size)],
+            }))
+    prices = pd.concat(frames)["listed_price"]
+    parts = [PriceSummary.from_frame(frame) for frame in frames]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        summary = PriceSummary()
+        for part in parts:
+            summary.merge(part) # only the summary that is merged into changes
+    seconds = (time.perf_counter() - start) / args.repeat
+
+    failed = False
+    statistics = summary.statistics()
+    exact = {"amount_total_products": len(prices), "price_mean": round(prices.mean(), 4), "price_variance": round(prices.var(), 4), 
+             "price_skewness": round(prices.skew(), 3), "price_min": round(prices.min(), 4), "price_max": round(prices.max(), 4)}
+    for column, value in exact.items():
+        if abs(statistics[column] - value) > 1e-3:
+            failed = True
+            print(f"summaries: {column} is {statistics[column]} instead of {value}")
+
+    bound = 2 * 1.7 / summary.sketch.k
+    for q in (0.25, 0.5, 0.75):
+        value = summary.sketch.quantile(q)
+        error = max(0.0, (prices < value).mean() - q, q - (prices <= value).mean()) # distance of q to the ranks of the value
+        print(f"quantile {q}: sketch {round(value, 4)}, exact {round(prices.quantile(q), 4)}, rank error {round(error, 4)}")
+        if error > bound:
+            failed = True
+            print(f"summaries: rank error of quantile {q} is above {round(bound, 4)}")
+
+    print(f"{len(parts)} summaries of {len(prices)} prices merged in {round(seconds * 1000, 1)} ms "
+          f"({round(len(parts) / seconds)} summaries/s), {sum(map(len, summary.sketch.levels))} values kept in the sketch")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline benchmarks for Bazaar")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    extractors = subparsers.add_parser("extractors", help="compare the extractors in extractors.py")
+    extractors.add_argument("--html-dir", help="directory of saved category pages, synthetic pages are used if not given")
+    extractors.add_argument("--pages", type=int, default=10, help="amount of pages to extract")
+    extractors.add_argument("--repeat", type=int, default=3, help="how often every page is extracted")
+    extractors.set_defaults(run=benchmark_extractors)
+
+    grammages = subparsers.add_parser("grammage", help="compare the grammage parsers in grammage.py with the previous parser")
+    grammages.add_argument("--corpus", help="text file with one grammage per line, a synthetic corpus is used if not given")
+    grammages.add_argument("--size", type=int, default=200_000, help="size of the synthetic corpus")
+    grammages.set_defaults(run=benchmark_grammage)
+
+    buffers = subparsers.add_parser("buffer", help="compare the columnar ProductBuffer with a list of product dictionaries")
+    buffers.add_argument("--products", type=int, default=10_000, help="amount of products")
+    buffers.add_argument("--repeat", type=int, default=5, help="how often every pipeline is run")
+    buffers.set_defaults(run=benchmark_buffer)
+
+    scrapers = subparsers.add_parser("scraper", help="run the whole scraper against the local stand-in server of fixture_server.py")
+    scrapers.add_argument("--fixtures", help="folder with one subfolder of captured pages (1.html, 2.html, ...) per category, synthetic pages are used if not given")
+    scrapers.add_argument("--stores", type=int, default=1, help="amount of store locations")
+    scrapers.add_argument("--categories", type=int, default=4, help="amount of synthetic categories")
+    scrapers.add_argument("--pages", type=int, default=5, help="amount of pages per synthetic category")
+    scrapers.add_argument("--latency", type=float, default=0.05, help="average seconds every response is delayed by")
+    scrapers.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    scrapers.add_argument("--reset-rate", type=float, default=0.0, help="share of connections dropped without a response")
+    scrapers.add_argument("--rate", type=float, default=20.0, help="requests per second allowed by the token bucket")
+    scrapers.add_argument("--adaptive", action="store_true", help="let the AIMD controller adapt the request rate")
+    scrapers.add_argument("--parallel-stores", action="store_true", help="scrape every store in its own process")
+    scrapers.add_argument("--no-page-cache", action="store_true", help="disable the page cache")
+    scrapers.add_argument("--archive", action="store_true", help="archive the raw responses")
+    scrapers.add_argument("--runs", type=int, default=1, help="amount of consecutive runs")
+    scrapers.set_defaults(run=benchmark_scraper)
+
+    summaries = subparsers.add_parser("summaries", help="merge the price summaries of summaries.py and compare them with the raw prices")
+    summaries.add_argument("--days", type=int, default=30, help="amount of days")
+    summaries.add_argument("--categories", type=int, default=20, help="amount of categories per day")
+    summaries.add_argument("--products", type=int, default=500, help="average amount of products per category")
+    summaries.add_argument("--repeat", type=int, default=3, help="how often the summaries are merged")
+    summaries.set_defaults(run=benchmark_summaries)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
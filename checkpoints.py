@@ -0,0 +1,89 @@
+import json
+import os
+import sqlite3
+
+from product_buffer import ProductBuffer
+
+"""
+checkpoint journal of the pages that have been scraped during the current day's run.
+The Scraper class records every finished page together with its products, so a run that was stopped by an error or a
+SIGTERM continues with the first missing page of every category when it is restarted instead of repeating all requests.
+The journal of a store is cleared once its products have been written to the database.
+"""
+
+
+class CheckpointJournal:
+    """
+    SQLite backed journal of the scraped pages, keyed by date, store, category and page.
+
+    Args:
+    path: the location of the SQLite file of the journal.
+    today: the date of the current run. Checkpoints of previous days are removed when the journal is opened.
+    """
+
+    def __init__(self, path, today):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.today = today.isoformat()
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    date TEXT NOT NULL,
+                    store TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    last_page INTEGER,
+                    products TEXT NOT NULL,
+                    PRIMARY KEY (date, store, category, page)
+                )""")
+            self.connection.execute("DELETE FROM pages WHERE date != ?", (self.today,))
+
+
+    def load(self, store, category, date):
+        """
+        loads all pages of a category that have already been scraped today.
+
+        Args:
+        store: the store location.
+        category: the name of the category.
+        date: the date of the current run, used for the "date" column of every product.
+
+        Output:
+        a dictionary with the page numbers as keys and tuples of the ProductBuffer of the page and the last page
+        (only known for the first page, None otherwise) as values.
+        """
+
+        rows = self.connection.execute(
+            "SELECT page, last_page, products FROM pages WHERE date = ? AND store = ? AND category = ?",
+            (self.today, store, category)
+        ).fetchall()
+        return {
+            page: (ProductBuffer.from_records(date, store, category, json.loads(products)), last_page)
+            for page, last_page, products in rows
+        }
+
+
+    def record(self, store, category, page, last_page, products):
+        """
+        saves a finished page and its products.
+        """
+
+        products = json.dumps(list(products.records(dimensions=False)))
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (date, store, category, page, last_page, products) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.today, store, category, page, last_page, products)
+            )
+
+
+    def clear(self, store):
+        """
+        removes all of today's checkpoints of a store once its products are safely stored in the database.
+        """
+
+        with self.connection:
+            self.connection.execute("DELETE FROM pages WHERE date = ? AND store = ?", (self.today, store))
+
+
+    def close(self):
+        self.connection.close()
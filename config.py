@@ -4,6 +4,120 @@ LOG_LEVEL = logging.INFO
 
 DATABASE_URL = "sqlite:///data/bazaar.db"
 
+## rate limiting for the HTTP requests sent to the REWE website. 
+## The rate is shared by all scrapers sending requests to the same host, no matter how many requests are in flight.
+## the REWE website blocks HTTP requests after roughly 85 requests when more than 1 request per second is sent.
+REQUESTS_PER_SECOND = 1.0 # initial rate of a host that has no learned rate yet, fixed rate if ADAPTIVE_RATE is disabled
+REQUEST_BURST = 1 # amount of requests that can be sent at once after the scraper was idle
+MAX_CONCURRENT_REQUESTS = 4 # amount of pages that a single scraper keeps in flight at the same time
+
+## if enabled, the request rate of every host adapts to the responses (additive increase, multiplicative decrease):
+## healthy responses raise the rate by AIMD_INCREASE requests per second every second, while 429 and 503 responses,
+## Cloudflare challenge pages and response times above LATENCY_SPIKE_FACTOR times the average cut it by the factor AIMD_DECREASE.
+## The rate reached at the end of a run is saved per host in RATE_LIMITS_FILE and used as the initial rate of the next run.
+ADAPTIVE_RATE = True
+AIMD_INCREASE = 0.05
+AIMD_DECREASE = 0.5
+AIMD_MIN_RATE = 0.2 # requests per second
+AIMD_MAX_RATE = 5.0
+LATENCY_SPIKE_FACTOR = 3.0
+LATENCY_SPIKE_MIN_SAMPLES = 10 # responses needed for the average response time before latency spikes are detected
+RATE_LIMITS_FILE = "data/rate_limits.json"
+
+## failed requests are retried with exponential backoff and jitter. Responses with these status codes count as failed requests,
+## 429 and 503 responses are retried after the time given in their Retry-After header if there is one.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_MAX_ATTEMPTS = 6 # a store is given up once a single page fails this many times in a row
+RETRY_BASE_DELAY = 2.0 # seconds, doubles with every failed attempt of a page
+RETRY_MAX_DELAY = 120.0
+RETRY_JITTER = 0.5 # fraction of the delay that is randomized
+
+## consecutive failed requests of a store open its circuit breaker, which pauses all requests of that store (but not of other stores).
+## A store is given up if its circuit breaker opens CIRCUIT_BREAKER_MAX_TRIPS times without a successful request in between.
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_COOLDOWN = 60.0 # seconds
+CIRCUIT_BREAKER_MAX_TRIPS = 3
+
+## the raw HTML of every page is parsed by a pool of parser processes while the next pages are being requested.
+## PARSE_QUEUE_SIZE limits the amount of pages that are fetched but not yet parsed, which keeps memory usage flat.
+PARSER_PROCESSES = 2
+PARSE_QUEUE_SIZE = 8
+
+## the extractor that turns the raw HTML of a page into products (see extractors.py). 
+## "lxml" reads the product tiles with compiled XPath expressions, "bs4" builds a full BeautifulSoup tree.
+EXTRACTOR = "lxml"
+
+## if enabled, the content hash, ETag and Last-Modified header and the extracted products of every page are saved in the page cache.
+## Pages that are unchanged since the previous run reuse the cached products instead of being parsed again.
+PAGE_CACHE = True
+PAGE_CACHE_FILE = "data/page_cache.db"
+
+## if enabled, every finished page is recorded in a checkpoint journal until the products of the store are written to the database.
+## A run that gets interrupted continues with the first missing page of every category when it is restarted on the same day.
+CHECKPOINTS = True
+CHECKPOINT_FILE = "data/checkpoints.db"
+
+## the User-Agent and Cloudflare cookies of the request sessions are shared by all scrapers of a run and saved in SESSION_FILE,
+## so the next run can reuse them instead of solving the Cloudflare challenge again. They are replaced after SESSION_MAX_AGE seconds.
+SESSION_FILE = "data/sessions.json"
+SESSION_MAX_AGE = 6 * 60 * 60
+
+## if enabled, the products are also exported as a Parquet dataset partitioned by date, store and category (see parquet_export.py),
+## written page by page during the scrape. The products of every partition are written in row groups of PARQUET_ROW_GROUP_SIZE.
+PARQUET_EXPORT = False
+PARQUET_PATH = "data/parquet"
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+## if enabled, the raw HTML of every requested page is saved in compressed, append-only segments (see archive.py), 
+## so the products of an archived day can be extracted again later with "python archive.py reextract <date>".
+ARCHIVE = True
+ARCHIVE_PATH = "data/archive"
+ARCHIVE_SEGMENT_PAGES = 50 # amount of pages per segment. The segments of a day are extracted again in parallel
+## the days of the archive older than ARCHIVE_RETENTION_DAYS are deleted at the start of every run, None keeps all days.
+## Pages that weren't modified are archived as a reference to their earlier response, so a page is requested in full again
+## once its archived response is half as old, which keeps the last ARCHIVE_RETENTION_DAYS / 2 days completely re-extractable.
+ARCHIVE_RETENTION_DAYS = 30
+
+## if enabled, the products of every page are written to the DailyData table in batches of SINK_BATCH_SIZE while the scrape is running,
+## instead of keeping all products of a store in memory and writing them once the store is finished.
+STREAMING_SINK = False
+SINK_BATCH_SIZE = 500
+
+## all batches are written to the database by a single writer thread in the main process (see writer.py).
+## WRITER_QUEUE_SIZE batches can wait for the writer before the scrapers have to wait as well, and the writer groups
+## the waiting batches into transactions of up to WRITER_TRANSACTION_ROWS rows, waiting up to WRITER_LINGER seconds for further batches.
+WRITER_QUEUE_SIZE = 20
+WRITER_TRANSACTION_ROWS = 20_000
+WRITER_LINGER = 0.5
+
+## data_handler.py reads the DailyData table in chunks of DAILY_DATA_CHUNK_ROWS rows and creates the statistics 
+## of every date and store as soon as its rows are read, so its memory usage doesn't grow with the size of the table.
+DAILY_DATA_CHUNK_ROWS = 200_000
+## the fingerprints of the partitions of date and store whose statistics are up to date. 
+## data_handler.py only calculates the statistics of new or changed partitions unless it is run with --rebuild.
+STATISTICS_WATERMARK_FILE = "data/statistics_watermark.json"
+## if enabled, the statistics are calculated inside the database on PostgreSQL instead of loading the DailyData rows into pandas.
+## Other databases always use pandas.
+STATISTICS_PUSH_DOWN = True
+## if enabled, data_handler.py also saves a mergeable summary of the prices of every date, store and category in the 
+## PriceSummaries table, which summaries.py rolls up to weekly, monthly or cross-store statistics without reading the DailyData table.
+## SKETCH_K sets the size (and accuracy) of the quantile sketches, the rank error of the quantiles is about 1.7 / SKETCH_K.
+## With STATISTICS_PUSH_DOWN the counts and moments of the summaries are calculated inside the database as well, but the
+## quantile sketches need every price: the price, bio label and offer columns of the changed partitions are still read into pandas.
+## Disable PRICE_SUMMARIES to keep all DailyData rows inside the database.
+PRICE_SUMMARIES = True
+SKETCH_K = 200
+
+## the last page of every category is saved after each run. If enabled, the pages up to the last page of the 
+## previous run get requested right away instead of waiting for the first page to reveal the pagination.
+SPECULATIVE_PAGINATION = True
+PAGINATION_HISTORY_PATH = "data/pagination"
+
+## if enabled, every store in LOCATIONS is scraped in its own worker process with its own session and token bucket.
+## MAX_STORE_PROCESSES limits the amount of worker processes, None starts one process per store.
+PARALLEL_STORES = False
+MAX_STORE_PROCESSES = None
+
 LOCATIONS = {
         "Tussmannstr. 41-63, 40477 Düsseldorf / Pempelfort": "s:ec2e8d2b-4bf3-458f-ab72-eb88b08621f2.Bl1RI1EEas+lPxvsLT2PrhyYaFUWiI7KsaVoOwDCod0",
         "Balanstr. 73, 81541 München": "s:01cef831-c0c3-40a2-a5c9-5a4ddfb06734.moF9Lu8M8LsGMd6yXJfj6Y3nUVobXaj0iqZmONuOJCU",
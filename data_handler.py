@@ -1,3 +1,5 @@
+import argparse
+import json
 import logging
 import os
 import signal
@@ -7,18 +9,47 @@ import time
 from logging.handlers import TimedRotatingFileHandler
 
 import pandas as pd
-from sqlalchemy import select, update, func
+from sqlalchemy import BigInteger, Float, Integer, Numeric, case, cast, func, literal, null, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 import db_utils
 import models
-from config import LOG_LEVEL
+from config import DAILY_DATA_CHUNK_ROWS, LOG_LEVEL, PRICE_SUMMARIES, STATISTICS_PUSH_DOWN, STATISTICS_WATERMARK_FILE
+from summaries import summarize, summarize_sketches
+
+## the dtypes of the DailyData columns once they are loaded
+DAILY_DATA_DTYPES = {
+    "store_id": "category",
+    "category_id": "category",
+    "product_id": "int64",
+    "has_bio_label": "bool",
+    "is_on_offer": "bool",
+    "listed_price": "float64",
+    "listed_amount": "float64",
+}
+
+## the columns the statistics are grouped by
+DAILY_STATISTICS_KEYS = ["date", "store_id"]
+CATEGORY_STATISTICS_KEYS = ["date", "store_id", "category_id"]
+
+## the row hash of the partition fingerprints (see Handler.row_hash): every column is mapped to (value * multiplier + offset) mod 
+## FINGERPRINT_MODULUS and the row hash is the product of these terms, so the products stay within 64 bit integers on every dialect
+FINGERPRINT_MODULUS = 2_147_483_647
+FINGERPRINT_MULTIPLIERS = (1_000_003, 998_244_353, 754_974_721, 167_772_161, 469_762_049, 1_004_535_809)
+
+## dialects whose aggregate functions can calculate all statistics inside the database (see Handler.statistics_query)
+PUSH_DOWN_DIALECTS = ("postgresql",)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="creates the statistics of the products in the DailyData table")
+    parser.add_argument("--rebuild", action="store_true", help="recalculate the statistics of every date and store instead of only the new or changed ones")
+    args = parser.parse_args()
+
     handler = Handler()
     signal.signal(signal.SIGTERM, Handler.shutdown)
     signal.signal(signal.SIGINT, Handler.shutdown)
-    handler.create_daily_statistics()
+    handler.create_daily_statistics(rebuild=args.rebuild)
     #handler.check_new_products()
     #handler.check_availability()
     #handler.check_changes()
@@ -30,7 +61,6 @@ def main():
 class Handler:
     def __init__(self):
         self.setup_logger()
-        self.daily_data = self.load_daily_data()
     
 
     def setup_logger(self):
@@ -69,164 +99,451 @@ class Handler:
             self.logger.addHandler(stream_handler)
 
 
-    def load_daily_data(self):
+    def read_daily_data(self, dates=None, chunksize=None):
         """
-        Creates a nested dictionary where the first layer are all unique dates listed in the DailyData table, the second
-        layer are all unique stores listed in the DailyData table and the values are pandas dataframes containing 
-        all products with the corresponding date and store. 
-        This allows for distinct iteration over all datasets saved in the self.daily_data variable.
+        reads the DailyData table with a single query, ordered by date and store.
+
+        Args:
+        dates: the dates to be read, None for all dates in the DailyData table.
+        chunksize: the amount of rows per dataframe, None to read the whole table into a single dataframe.
+
+        Output:
+        yields pandas dataframes of the DailyData rows.
         """
 
-        self.logger.info("loading data.")
-        # Get all unique dates and stores found in the DailyData table
+        query = select(models.DailyData).order_by(models.DailyData.date, models.DailyData.store_id)
+        if dates is not None:
+            query = query.where(models.DailyData.date.in_(dates))
+
         with db_utils.session_query() as session:
-            date_values = [d[0] for d in (session.query(models.DailyData.date).distinct().all())]
-            store_values = [s[0] for s in (session.query(models.DailyData.store_id).distinct().all())]
-                
-            # Build nested dictionary of datasets
-            daily_data = {}
-            for date in date_values:
-                daily_data[date] = {}
-                for store in store_values:
-                    query = session.query(models.DailyData).filter(
-                        models.DailyData.date == date,
-                        models.DailyData.store_id == store
-                    )
-                    df = pd.read_sql(query.statement, session.bind)
-                    if not df.empty:
-                        daily_data[date][store] = df
-        
-        return daily_data
+            # streams the rows from the database instead of buffering the whole result on the client
+            connection = session.connection(execution_options={"stream_results": True})
+            if chunksize is None:
+                yield pd.read_sql(query, connection)
+            else:
+                yield from pd.read_sql(query, connection, chunksize=chunksize)
+
+
+    @staticmethod
+    def apply_dtypes(df):
+        """
+        converts the DailyData columns to explicit dtypes: categoricals for the IDs and floats for the prices and amounts.
+        """
+
+        return df.astype(DAILY_DATA_DTYPES)
+
+
+    def load_daily_data(self, dates=None):
+        """
+        loads the DailyData rows of the given dates (or of all dates) into a single pandas dataframe.
+        """
+
+        self.logger.info("loading data.")
+        (df,) = self.read_daily_data(dates)
+        return self.apply_dtypes(df)
+
+
+    def daily_partitions(self, dates=None, chunksize=DAILY_DATA_CHUNK_ROWS):
+        """
+        hands out the DailyData rows partitioned by date and store, reading the table with a single query in chunks.
+        As the rows are ordered by date and store, every partition is a contiguous slice of a chunk and 
+        is handed out without copying it. The last partition of a chunk may continue in the next chunk, 
+        so it is held back and handed out together with the next chunk. The memory usage is bounded 
+        by the chunk size (plus the size of the largest partition).
+
+        Args:
+        dates: the dates to be read, None for all dates in the DailyData table.
+        chunksize: the amount of rows read from the database at once.
+
+        Output:
+        yields a tuple of the date, the store and a pandas dataframe of the products of every partition.
+        """
+
+        self.logger.info("loading data.")
+        carry = None # the rows of the last partition of the previous chunk
+        for chunk in self.read_daily_data(dates, chunksize):
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            chunk = chunk.reset_index(drop=True)
+            if chunk.empty:
+                continue
+            
+            # the first row of every partition is where the date or the store changes
+            keys = chunk[["date", "store_id"]]
+            starts = (keys != keys.shift()).any(axis=1).to_numpy().nonzero()[0].tolist()
+            carry = chunk.iloc[starts[-1]:]
+            
+            df = self.apply_dtypes(chunk)
+            for start, end in zip(starts[:-1], starts[1:]):
+                yield self.partition(df.iloc[start:end])
         
+        if carry is not None and not carry.empty:
+            yield self.partition(self.apply_dtypes(carry))
+
+
+    @staticmethod
+    def partition(df):
+        return df["date"].iat[0], int(df["store_id"].iat[0]), df
+
+
+    @staticmethod
+    def row_hash():
+        """
+        creates a SQL expression that hashes the product, category, price, amount, offer and bio label of a DailyData row.
+        Unlike sums of the single columns, the sum of the row hashes of a partition changes if products move between
+        categories or swap their prices, since every column is multiplied with the others.
+        """
+
+        DailyData = models.DailyData
+
+        def cents(column):
+            # NULL is kept apart from 0
+            return func.coalesce(cast(func.round(column * 100), BigInteger) + 1, 0)
+
+        columns = [
+            cast(DailyData.product_id, BigInteger),
+            cast(DailyData.category_id, BigInteger),
+            cents(DailyData.listed_price),
+            cents(DailyData.listed_amount),
+            cast(cast(DailyData.is_on_offer, Integer), BigInteger), # PostgreSQL only casts booleans to integer
+            cast(cast(DailyData.has_bio_label, Integer), BigInteger),
+        ]
+        row_hash = literal(1, BigInteger)
+        for offset, (column, multiplier) in enumerate(zip(columns, FINGERPRINT_MULTIPLIERS), start=1):
+            term = (column % FINGERPRINT_MODULUS * multiplier + offset) % FINGERPRINT_MODULUS
+            row_hash = row_hash * term % FINGERPRINT_MODULUS
+        return row_hash
+
+
+    def partition_fingerprints(self):
+        """
+        summarizes every partition of date and store in the DailyData table with a single aggregate query.
+        The fingerprint of a partition changes whenever products are added or removed, or change their category, price, 
+        amount, offer or bio label (see row_hash).
+
+        Output:
+        a dictionary with a tuple of date and store as keys and the fingerprint (a list of strings) as values.
+        """
+
+        DailyData = models.DailyData
+        query = (
+            select(
+                DailyData.date,
+                DailyData.store_id,
+                func.count(),
+                func.sum(self.row_hash()),
+            )
+            .group_by(DailyData.date, DailyData.store_id)
+        )
+        with db_utils.session_query() as session:
+            return {(date, store): [str(value) for value in summary] for date, store, *summary in session.execute(query)}
+
+
+    def load_watermark(self):
+        """
+        loads the fingerprints of the partitions whose statistics were created during the previous runs.
+        """
+
+        try:
+            with open(STATISTICS_WATERMARK_FILE) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
 
-    def create_daily_statistics(self):
+    def save_watermark(self, watermark):
+        os.makedirs(os.path.dirname(STATISTICS_WATERMARK_FILE), exist_ok=True)
+        with open(STATISTICS_WATERMARK_FILE, "w") as file:
+            json.dump(watermark, file, indent=4)
+
+
+    @staticmethod
+    def watermark_key(date, store):
+        return f"{date.isoformat()}/{store}"
+
+
+    def create_daily_statistics(self, rebuild=False):
         """
-        creates the iterative logic for calculating and inserting both the
-        daily statistics and the category statistics by creating a data subset for every 
-        unique combination of date and store and passing that data subset to
-        the calculate_statistics function.
+        creates the iterative logic for calculating and inserting both the daily statistics and the category statistics.
+        Only the partitions of date and store that are new or have changed since their statistics were created
+        are calculated (see partition_fingerprints), unless rebuild is set. The statistics of every partition are 
+        calculated in a single pass over its categories (see calculate_statistics) and all rows are written 
+        with a single upsert per table.
+
+        Args:
+        rebuild: recalculates the statistics of all partitions, e.g. after a change to the calculation.
         """
 
-        for date, store_subset in self.daily_data.items():
-            for store, df in store_subset.items():
-                self.calculate_statistics(df, date, store)
+        if PRICE_SUMMARIES:
+            # databases initialised before the price summaries were introduced don't have their table yet
+            models.PriceSummaries.__table__.create(db_utils.engine, checkfirst=True)
 
+        fingerprints = self.partition_fingerprints()
+        watermark = {} if rebuild else self.load_watermark()
+        with db_utils.session_query() as session:
+            calculated = set(session.query(models.DailyStatistics.date, models.DailyStatistics.store_id).all())
+            if PRICE_SUMMARIES:
+                # partitions without price summaries (e.g. from before the summaries were introduced) are calculated again
+                calculated &= set(session.query(models.PriceSummaries.date, models.PriceSummaries.store_id).distinct().all())
+        stale = {partition for partition, fingerprint in fingerprints.items() 
+                 if partition not in calculated or watermark.get(self.watermark_key(*partition)) != fingerprint}
+        self.logger.info(f"{len(stale)} of {len(fingerprints)} partitions of date and store need new statistics.")
+        if not stale:
+            return
+
+        if STATISTICS_PUSH_DOWN and db_utils.engine.dialect.name in PUSH_DOWN_DIALECTS:
+            self.create_statistics_in_database(stale)
+        else:
+            self.create_statistics_in_pandas(stale)
+
+        # only the partitions that are still in the DailyData table are kept in the watermark
+        self.save_watermark({self.watermark_key(*partition): fingerprint for partition, fingerprint in fingerprints.items()})
+
+
+    def create_statistics_in_pandas(self, partitions):
+        """
+        loads the given partitions of date and store, calculates their statistics and price summaries (see summaries.py) 
+        with pandas and writes them with a single upsert per table.
+
+        Args:
+        partitions: a set of tuples of date and store.
+        """
 
-    def calculate_statistics(self, df, date, store, category=None):
+        daily_statistics = []
+        category_statistics = []
+        price_summaries = []
+        for date, store, df in self.daily_partitions(dates=sorted({date for date, _ in partitions})):
+            if (date, store) not in partitions:
+                continue
+            self.logger.info(f"calculating statistics. date: {date}. store_id: {store}.")
+            daily_statistics.append(self.calculate_statistics(df, DAILY_STATISTICS_KEYS))
+            category_statistics.append(self.calculate_statistics(df, CATEGORY_STATISTICS_KEYS))
+            if PRICE_SUMMARIES:
+                price_summaries.extend(summarize(df))
+
+        if daily_statistics:
+            self.logger.info("inserting daily statistics into database.")
+            db_utils.bulk_load(models.DailyStatistics, pd.concat(daily_statistics).to_dict(orient="records"))
+            self.logger.info("inserting category statistics into database.")
+            db_utils.bulk_load(models.CategoryStatistics, pd.concat(category_statistics).to_dict(orient="records"))
+        if price_summaries:
+            self.logger.info("inserting price summaries into database.")
+            db_utils.bulk_load(models.PriceSummaries, price_summaries)
+
+
+    def create_statistics_in_database(self, partitions):
         """
-        calculates a set of statistical data points and
-        inserts them into the DailyStatistics table in the database.
+        calculates the statistics of the given partitions of date and store inside the database and writes them 
+        with a single INSERT ... SELECT per table, so not a single DailyData row has to leave the database.
+        Uses the same definitions as calculate_statistics: sample standard deviation and variance, 
+        linearly interpolated median and quartiles, and the adjusted Fisher-Pearson skewness.
+        The counts and moments of the price summaries are calculated the same way, only their quantile sketches 
+        are created from the prices in pandas (see create_price_sketches).
 
         Args:
-        df: the data subset created by the create_daily_statistics function.
-        date: a date listed in the DailyData database.
-        store: a store listed in the DailyData database.
-        session: a session object created by the create_daily_statistics function to interact with the database.
-        category: a category listed in the DailyData database. Default is set to None for calculation on the whole dataset.
+        partitions: a set of tuples of date and store.
+        """
+
+        queries = [
+            (models.DailyStatistics, self.statistics_query(DAILY_STATISTICS_KEYS, partitions)),
+            (models.CategoryStatistics, self.statistics_query(CATEGORY_STATISTICS_KEYS, partitions)),
+        ]
+        if PRICE_SUMMARIES:
+            queries.append((models.PriceSummaries, self.price_summary_query(partitions)))
+
+        for ORM, query in queries:
+            self.logger.info(f"calculating and inserting {ORM.__tablename__} in the database.")
+            stmt = pg_insert(ORM.__table__).from_select([column.name for column in query.selected_columns], query)
+            primary_keys = [column.name for column in ORM.__table__.primary_key.columns]
+            stmt = stmt.on_conflict_do_update(
+                index_elements=primary_keys,
+                set_={column.name: stmt.excluded[column.name] for column in query.selected_columns if column.name not in primary_keys}
+            )
+            with db_utils.session_commit() as session:
+                session.execute(stmt)
         
-        Output: 
-        database entries both in the DailyStatistics table and in the CategoryStatistics table.
+        if PRICE_SUMMARIES:
+            self.create_price_sketches(partitions)
+
+
+    def price_summary_query(self, partitions):
+        """
+        creates a query that calculates the counts, minimum, maximum, mean and the sums of the squared and cubed deviations 
+        from the mean of the price summaries (see summaries.PriceSummary) with the aggregate functions of PostgreSQL.
+
+        Args:
+        partitions: a set of tuples of date and store the query is restricted to.
+        """
+
+        DailyData = models.DailyData
+        price = cast(DailyData.listed_price, Float)
+        count = func.count(price)
+        mean = func.avg(price)
+
+        # the sums of the deviations are calculated from the power sums of the prices, like in statistics_query
+        m2 = func.var_pop(price) * count
+        m3 = func.sum(price * price * price) - 3 * mean * func.sum(price * price) + 2 * count * mean * mean * mean
+
+        columns = [getattr(DailyData, key) for key in CATEGORY_STATISTICS_KEYS] + [
+            func.count().label("amount_total_products"),
+            func.count().filter(DailyData.has_bio_label).label("amount_bio_products"),
+            func.count().filter(DailyData.is_on_offer).label("amount_reduced_products"),
+            count.label("price_count"),
+            func.min(price).label("price_min"),
+            func.max(price).label("price_max"),
+            func.coalesce(mean, 0.0).label("price_mean"),
+            func.coalesce(m2, 0.0).label("price_m2"),
+            func.coalesce(m3, 0.0).label("price_m3"),
+        ]
+
+        return (
+            select(*columns)
+            .where(tuple_(DailyData.date, DailyData.store_id).in_(sorted(partitions)))
+            .group_by(*[getattr(DailyData, key) for key in CATEGORY_STATISTICS_KEYS])
+        )
+
+
+    def create_price_sketches(self, partitions):
+        """
+        creates the quantile sketches of the price summaries of the given partitions of date and store.
+        The sketches need every price, so only the price, bio label and offer columns of the partitions are read
+        instead of whole DailyData rows.
+
+        Args:
+        partitions: a set of tuples of date and store.
         """
+
+        DailyData = models.DailyData
+        query = (
+            select(DailyData.date, DailyData.store_id, DailyData.category_id, 
+                   DailyData.listed_price, DailyData.has_bio_label, DailyData.is_on_offer)
+            .where(tuple_(DailyData.date, DailyData.store_id).in_(sorted(partitions)))
+        )
+        self.logger.info("creating the quantile sketches of the price summaries.")
+        with db_utils.session_query() as session:
+            connection = session.connection(execution_options={"stream_results": True})
+            df = pd.read_sql(query, connection).astype({key: DAILY_DATA_DTYPES[key] for key in ("listed_price", "has_bio_label", "is_on_offer")})
+        db_utils.bulk_load(models.PriceSummaries, summarize_sketches(df))
+
+
+    def statistics_query(self, keys, partitions):
+        """
+        creates a query that calculates the statistical data points of calculate_statistics 
+        with the aggregate functions of PostgreSQL, grouped by the given keys.
+
+        Args:
+        keys: DAILY_STATISTICS_KEYS or CATEGORY_STATISTICS_KEYS.
+        partitions: a set of tuples of date and store the query is restricted to.
+        """
+
+        DailyData = models.DailyData
+        price = cast(DailyData.listed_price, Float)
+        count = cast(func.count(price), Float) # products with a price, used for the moments
+        total = func.count() # all products, like the amount_total_products of calculate_statistics
+        amount_bio = func.count().filter(DailyData.has_bio_label)
+        amount_reduced = func.count().filter(DailyData.is_on_offer)
+        median = func.percentile_cont(0.5).within_group(price)
+        quartile_1 = func.percentile_cont(0.25).within_group(price)
+        quartile_3 = func.percentile_cont(0.75).within_group(price)
         
-        # this reduces the dataset to only the rows with the fitting category if a category is passed into the method
-        if category != None:
-            df = df[df["category_id"]== category]
-            self.logger.info(f"calculating category statistics. date: {date}. category_id: {category}.")
-        else:
-            self.logger.info(f"calculating daily statistics. date: {date}.")
-
-
-        price_min = df["listed_price"].min()
-        price_max = df["listed_price"].max()
-        price_mean = df["listed_price"].mean()
-        price_median = df["listed_price"].median()
-        price_skewness = df["listed_price"].skew()
-        price_standard_deviation = df["listed_price"].std()
-        price_variance = df["listed_price"].var()
-        price_range = price_max - price_min
-        price_quartile_1 = df["listed_price"].quantile(0.25)
-        price_quartile_3 = df["listed_price"].quantile(0.75)
-        IQR = price_quartile_3 - price_quartile_1 
-
-        amount_total_products = len(df)
-        amount_bio_products = (df["has_bio_label"]== 1).sum()
-        amount_reduced_products = (df["is_on_offer"]== 1).sum()
-        percentage_reduced_products = ((amount_reduced_products / amount_total_products) * 100) if amount_reduced_products else 0
-        percentage_bio_products = ((amount_bio_products / amount_total_products) * 100) if amount_bio_products else 0
-
-        if category != None:
-            green_premium = (
-                (((df.loc[df["has_bio_label"]== 1, "listed_price"]).median()) 
-                 - price_median) 
-                 if amount_bio_products else 0)
+        # the skewness is calculated from the power sums of the prices, like pandas does: 
+        # G1 = sqrt(n * (n - 1)) / (n - 2) * m3 / m2^1.5 with the central moments m2 and m3
+        mean = func.avg(price)
+        m2 = func.var_pop(price)
+        m3 = func.sum(price * price * price) / count - 3 * mean * func.sum(price * price) / count + 2 * mean * mean * mean
+        skewness = case(
+            (count < 3, null()),
+            (m2 < 1e-14, 0.0),
+            else_=func.sqrt(count * (count - 1)) / (count - 2) * m3 / func.power(m2, 1.5)
+        )
+
+        def rounded(expression, digits=4):
+            return func.round(cast(expression, Numeric), digits)
+
+        columns = [getattr(DailyData, key) for key in keys] + [
+            rounded(func.min(price)).label("price_min"),
+            rounded(func.max(price)).label("price_max"),
+            rounded(mean).label("price_mean"),
+            rounded(median).label("price_median"),
+            rounded(skewness, 3).label("price_skewness"),
+            rounded(func.stddev_samp(price)).label("price_standard_deviation"),
+            rounded(func.var_samp(price)).label("price_variance"),
+            rounded(func.max(price) - func.min(price)).label("price_range"),
+            rounded(quartile_1).label("price_quartile_1"),
+            rounded(quartile_3).label("price_quartile_3"),
+            rounded(quartile_3 - quartile_1).label("IQR"),
+            total.label("amount_total_products"),
+            amount_bio.label("amount_bio_products"),
+            amount_reduced.label("amount_reduced_products"),
+            rounded(case((amount_bio > 0, amount_bio * 100.0 / total), else_=0)).label("percentage_bio_products"),
+            rounded(case((amount_reduced > 0, amount_reduced * 100.0 / total), else_=0)).label("percentage_reduced_products"),
+        ]
+        if "category_id" in keys:
+            bio_median = func.percentile_cont(0.5).within_group(price).filter(DailyData.has_bio_label)
+            regular_median = func.percentile_cont(0.5).within_group(price).filter(~DailyData.is_on_offer)
+            columns += [
+                rounded(case((amount_bio > 0, bio_median - median), else_=0)).label("green_premium"),
+                rounded(case((amount_reduced > 0, regular_median - median), else_=0)).label("average_savings"),
+            ]
+
+        return (
+            select(*columns)
+            .where(tuple_(DailyData.date, DailyData.store_id).in_(sorted(partitions)))
+            .group_by(*[getattr(DailyData, key) for key in keys])
+        )
+
+
+    def calculate_statistics(self, df, keys):
+        """
+        calculates a set of statistical data points for every group of the given keys in a single groupby pass.
+
+        Args:
+        df: a subset of the DailyData table, e.g. a partition created by the daily_partitions function.
+        keys: the columns to group by. DAILY_STATISTICS_KEYS for the DailyStatistics table, 
+        CATEGORY_STATISTICS_KEYS for the CategoryStatistics table (which adds the green premium and average savings).
         
-        if category != None:
-            average_savings = (
-                (((df.loc[df["is_on_offer"]== 0, "listed_price"]).median()) 
-                - price_median) 
-                if amount_reduced_products else 0)
-
-
-        if category == None:
-            daily_statistics = {
-                "date": date,
-                "store_id": store,
-                "price_min": round(price_min, 4),
-                "price_max": round(price_max, 4),
-                "price_mean": round(price_mean, 4),
-                "price_median": round(price_median, 4),
-                "price_skewness": round(price_skewness, 3),
-                "price_standard_deviation": round(price_standard_deviation, 4),
-                "price_variance": round(price_variance, 4),
-                "price_range": round(price_range, 4),
-                "price_quartile_1": round(price_quartile_1, 4),
-                "price_quartile_3": round(price_quartile_3, 4),
-                "IQR": round(IQR, 4),
-                "amount_total_products": int(amount_total_products),
-                "amount_bio_products": int(amount_bio_products),
-                "amount_reduced_products": int(amount_reduced_products),
-                "percentage_bio_products": round(percentage_bio_products, 4),
-                "percentage_reduced_products": round(percentage_reduced_products, 4),
-            }
-            
-            self.logger.info("inserting daily statistics into database.\n")
-            db_utils.bulk_upsert(models.DailyStatistics, daily_statistics)
+        Output: 
+        a pandas dataframe with one row per group, structured after the DailyStatistics or CategoryStatistics ORM.
+        """
+
+        grouped = df.groupby(keys, observed=True)
+        statistics = grouped.agg(
+            price_min=("listed_price", "min"),
+            price_max=("listed_price", "max"),
+            price_mean=("listed_price", "mean"),
+            price_median=("listed_price", "median"),
+            price_skewness=("listed_price", "skew"),
+            price_standard_deviation=("listed_price", "std"),
+            price_variance=("listed_price", "var"),
+            amount_total_products=("listed_price", "size"),
+            amount_bio_products=("has_bio_label", "sum"),
+            amount_reduced_products=("is_on_offer", "sum"),
+        )
+        quartiles = grouped["listed_price"].quantile([0.25, 0.75]).unstack()
+        statistics["price_range"] = statistics["price_max"] - statistics["price_min"]
+        statistics["price_quartile_1"] = quartiles[0.25]
+        statistics["price_quartile_3"] = quartiles[0.75]
+        statistics["IQR"] = statistics["price_quartile_3"] - statistics["price_quartile_1"]
         
-        else:
-            category_statistics = {
-                "date": date,
-                "store_id": store,
-                "category_id": category,
-                "price_min": round(price_min, 4),
-                "price_max": round(price_max, 4),
-                "price_mean": round(price_mean, 4),
-                "price_median": round(price_median, 4),
-                "price_skewness": round(price_skewness, 3),
-                "price_standard_deviation": round(price_standard_deviation, 4),
-                "price_variance": round(price_variance, 4),
-                "price_range": round(price_range, 4),
-                "price_quartile_1": round(price_quartile_1, 4),
-                "price_quartile_3": round(price_quartile_3, 4),
-                "IQR": round(IQR, 4),
-                "amount_total_products": int(amount_total_products),
-                "amount_bio_products": int(amount_bio_products),
-                "amount_reduced_products": int(amount_reduced_products),
-                "percentage_bio_products": round(percentage_bio_products, 4),
-                "percentage_reduced_products": round(percentage_reduced_products, 4),
-                "green_premium": round(green_premium, 4),
-                "average_savings": round(average_savings, 4)
-            }
-
-            self.logger.info("inserting category statistics into database.\n")
-            db_utils.bulk_upsert(models.CategoryStatistics, category_statistics)
-
-        # this part extracts all categories listed in the dataset and recursively creates statistics for each category
-        # once the daily statistics and all category statistics are calculated and inserted, the next dataset is iterated upon
-        if category == None:
-            category_datapoints = df["category_id"].unique().tolist()
-            category_datapoints.sort()
-            for category_key in category_datapoints:
-                self.calculate_statistics(df, date, store, category=category_key)
+        total = statistics["amount_total_products"]
+        statistics["percentage_bio_products"] = (statistics["amount_bio_products"] / total * 100).where(statistics["amount_bio_products"] > 0, 0)
+        statistics["percentage_reduced_products"] = (statistics["amount_reduced_products"] / total * 100).where(statistics["amount_reduced_products"] > 0, 0)
+
+        if "category_id" in keys:
+            # the median price of the products with a bio label and of the products that are not on offer, relative to the median price
+            bio_median = df[df["has_bio_label"]].groupby(keys, observed=True)["listed_price"].median().reindex(statistics.index)
+            regular_median = df[~df["is_on_offer"]].groupby(keys, observed=True)["listed_price"].median().reindex(statistics.index)
+            statistics["green_premium"] = (bio_median - statistics["price_median"]).where(statistics["amount_bio_products"] > 0, 0)
+            statistics["average_savings"] = (regular_median - statistics["price_median"]).where(statistics["amount_reduced_products"] > 0, 0)
+
+        statistics = statistics.round(4)
+        statistics["price_skewness"] = statistics["price_skewness"].round(3)
+        statistics = statistics.astype({"amount_total_products": "int64", "amount_bio_products": "int64", "amount_reduced_products": "int64"})
+        statistics = statistics.reset_index()
+        statistics["store_id"] = statistics["store_id"].astype("int64")
+        if "category_id" in keys:
+            statistics["category_id"] = statistics["category_id"].astype("int64")
+        return statistics
 
 
     def check_new_products(self):
@@ -241,12 +558,7 @@ class Handler:
         with db_utils.session_query() as session:
             product_ids = [p for (p,) in session.query(models.Products.product_id).distinct().all()]
         
-        ## flattens the DailyData dataset into a single data frame 
-        new_products_grouped = []
-        for date in self.daily_data:
-            for store in self.daily_data[date]:
-                new_products_grouped.append(self.daily_data[date][store])
-        new_products = pd.concat(new_products_grouped)
+        new_products = self.load_daily_data()
 
         existing_products = []
         for index, value in new_products["product_id"].items():
@@ -282,7 +594,7 @@ class Handler:
         latest_entries = (
             new_products
             .sort_values("date")
-            .groupby(["product_id", "store_id"], as_index=False)
+            .groupby(["product_id", "store_id"], as_index=False, observed=True)
             .last()
         )
         
@@ -351,14 +663,10 @@ class Handler:
 
         self.logger.info("checking for changes between products in dataset and ProductObservations.")
         
-        new_products_grouped = []
-        for date in self.daily_data:
-            for store in self.daily_data[date]:
-                new_products_grouped.append(self.daily_data[date][store])
-        new_products = (pd
-                        .concat(new_products_grouped)
+        new_products = (self
+                        .load_daily_data()
                         .sort_values("date")
-                        .groupby(["product_id", "store_id"], as_index=False)
+                        .groupby(["product_id", "store_id"], as_index=False, observed=True)
                         .last()
                         .drop(columns=["product_name", "has_bio_label", "category_id"], axis=1)
             )
@@ -1,8 +1,13 @@
-from database_engine import SessionLocal
+import io
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from database_engine import SessionLocal, engine
+from sqlalchemy import bindparam
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
-from contextlib import contextmanager
 
 
 @contextmanager
@@ -30,62 +35,254 @@ def session_commit():
         session.close()
 
 
+## maximum amount of bound parameters in a single statement for every dialect handled in bulk_upsert
+PARAMETER_LIMITS = {
+    "postgresql": 65535,
+    "mysql": 65535,
+    "sqlite": 32766, # SQLite versions before 3.32 only allow 999, see parameter_limit
+}
+
+
+def parameter_limit(dialect):
+    """
+    returns the maximum amount of bound parameters in a single statement of the given SQLAlchemy dialect.
+    """
+
+    if dialect.name == "sqlite" and dialect.dbapi.sqlite_version_info < (3, 32, 0):
+        return 999
+    return PARAMETER_LIMITS.get(dialect.name, 999)
+
+
+def upsert_statement(dialect_name, table, primary_keys, update_columns):
+    """
+    creates a single upsert statement for the given dialect that gets compiled once and executed for every row of a batch.
+    Returns None for dialects without a native upsert.
+    """
+
+    ## PostgreSQL specific upsert logic
+    if dialect_name == "postgresql":
+        stmt = pg_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=primary_keys,
+            set_={col: getattr(stmt.excluded, col) for col in update_columns}
+        )
+    
+    ## MySQL specific upsert logic
+    if dialect_name == "mysql":
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(
+            {col: getattr(stmt.inserted, col) for col in update_columns}
+        )
+    
+    ## SQLite specific upsert logic
+    if dialect_name == "sqlite":
+        stmt = sqlite_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=primary_keys,
+            set_={col: getattr(stmt.excluded, col) for col in update_columns}
+        )
+    
+    return None
+
+
 def bulk_upsert(ORM, data):
     """
     upsert multiple rows into a given table with a composite primary key.
+    The rows are split into batches sized from the bound parameter limit of the dialect, and every batch is sent
+    with executemany using the same compiled statement. All batches are written in a single transaction.
 
     Args:
     ORM: SQLAlchemy ORM class
     data: either dictionary or list of dictionaries to be upserted into the database
+
+    Output:
+    a tuple of the amount of rows upserted and the seconds it took, e.g. for reporting the rows per second.
     """
-    ## 
+    
     table = ORM.__table__
     if isinstance(data, dict):
         data = [data]
+    if not data:
+        return 0, 0.0
 
+    start = time.perf_counter()
     # Get primary key column names
     primary_keys = [col.name for col in table.primary_key.columns]
     # Columns to update (all except primary keys)
     update_columns = [col for col in data[0].keys() if col not in primary_keys]
     
     with session_commit() as session:
-        dialect_name = session.bind.dialect.name
+        dialect = session.bind.dialect
+        batch_size = max(1, parameter_limit(dialect) // len(data[0]))
+        stmt = upsert_statement(dialect.name, table, primary_keys, update_columns)
 
-        ## PostgreSQL specific upsert logic
-        if dialect_name == "postgresql":
-            stmt = pg_insert(table).values(data)
-            stmt = stmt.on_conflict_do_update(
-                index_elements=primary_keys,
-                set_={col: getattr(stmt.excluded, col) for col in update_columns}
-            )
-        
-        ## MySQL specific upsert logic
-        elif dialect_name == "mysql":
-            stmt = mysql_insert(table).values(data)
-            stmt = stmt.on_duplicate_key_update(
-                {col: getattr(stmt.inserted, col) for col in update_columns}
-            )
-        
-        ## SQLite specific upsert logic
-        elif dialect_name == "sqlite":
-            stmt = sqlite_insert(table).values(data)
-            stmt = stmt.on_conflict_do_update(
-                index_elements=primary_keys,
-                set_={col: getattr(stmt.excluded, col) for col in update_columns}
-            )
+        # For supported dialects, do bulk upsert
+        if stmt is not None:
+            for offset in range(0, len(data), batch_size):
+                session.execute(stmt, data[offset:offset + batch_size])
         
-        # Fallback: generic upsert (slow, not bulk)
+        # Fallback: generic upsert (not bulk). The UPDATE and INSERT statements are compiled once and reused for every row
         else:
+            update_stmt = table.update().where(
+                *(getattr(table.c, col) == bindparam(f"pk_{col}") for col in primary_keys)
+            ).values({col: bindparam(f"new_{col}") for col in update_columns})
+            insert_stmt = table.insert()
             for row in data:
                 # Try update, if rowcount==0 then insert
-                update_stmt = table.update().where(
-                    *(getattr(table.c, col) == row[col] for col in primary_keys)
-                ).values({col: row[col] for col in update_columns})
-                result = session.execute(update_stmt)
-                
+                result = session.execute(update_stmt, {**{f"pk_{col}": row[col] for col in primary_keys}, 
+                                                       **{f"new_{col}": row[col] for col in update_columns}})
                 if result.rowcount == 0:
-                    session.execute(table.insert().values(**row))
-            return
+                    session.execute(insert_stmt, row)
 
-        # For supported dialects, do bulk upsert
-        session.execute(stmt)
\ No newline at end of file
+    return len(data), time.perf_counter() - start
+
+
+def bulk_insert_missing(ORM, data):
+    """
+    inserts multiple rows into a given table in a single statement and skips the rows that violate a unique constraint,
+    e.g. names that were created by another process in the meantime.
+
+    Args:
+    ORM: SQLAlchemy ORM class
+    data: list of dictionaries to be inserted into the database
+    """
+
+    table = ORM.__table__
+    if not data:
+        return
+
+    with session_commit() as session:
+        dialect_name = session.bind.dialect.name
+        if dialect_name == "postgresql":
+            stmt = pg_insert(table).values(data).on_conflict_do_nothing()
+        elif dialect_name == "mysql":
+            stmt = mysql_insert(table).values(data).prefix_with("IGNORE")
+        elif dialect_name == "sqlite":
+            stmt = sqlite_insert(table).values(data).on_conflict_do_nothing()
+        else:
+            stmt = table.insert().values(data)
+        session.execute(stmt)
+
+
+def copy_value(value):
+    """
+    formats a single value for the text format of PostgreSQL's COPY command.
+    """
+
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyStream(io.TextIOBase):
+    """
+    file-like object that formats the rows for COPY while the database reads them, 
+    so the rows never have to be held in memory as one large string.
+    """
+
+    def __init__(self, data, columns):
+        self.lines = ("\t".join(copy_value(row[col]) for col in columns) + "\n" for row in data)
+        self.pending = ""
+
+
+    def readable(self):
+        return True
+
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.pending += line
+        if size < 0:
+            size = len(self.pending)
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def copy_upsert(ORM, data):
+    """
+    upsert multiple rows into a given table of a PostgreSQL database with a composite primary key.
+    The rows are streamed into a temporary staging table with COPY and merged into the table with a single
+    INSERT ... ON CONFLICT, so the whole load takes a few round-trips instead of binding parameters for every row.
+    Works with psycopg2 as well as psycopg 3.
+
+    Args:
+    ORM: SQLAlchemy ORM class
+    data: either dictionary or list of dictionaries to be upserted into the database
+
+    Output:
+    a tuple of the amount of rows upserted and the seconds it took.
+    """
+
+    table = ORM.__table__
+    if isinstance(data, dict):
+        data = [data]
+    if not data:
+        return 0, 0.0
+
+    start = time.perf_counter()
+    primary_keys = [col.name for col in table.primary_key.columns]
+    columns = list(data[0].keys())
+    update_columns = [col for col in columns if col not in primary_keys]
+
+    with session_commit() as session:
+        connection = session.connection()
+        quote = connection.dialect.identifier_preparer.quote
+        target = connection.dialect.identifier_preparer.format_table(table)
+        staging = quote(f"staging_{table.name}")
+        column_list = ", ".join(quote(col) for col in columns)
+        key_list = ", ".join(quote(col) for col in primary_keys)
+        if update_columns:
+            conflict = "DO UPDATE SET " + ", ".join(f"{quote(col)} = EXCLUDED.{quote(col)}" for col in update_columns)
+        else:
+            conflict = "DO NOTHING"
+
+        # the staging table only lives until the end of the transaction
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE {staging} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP")
+            copy = f"COPY {staging} ({column_list}) FROM STDIN"
+            if hasattr(cursor, "copy_expert"): # psycopg2
+                cursor.copy_expert(copy, CopyStream(data, columns))
+            else: # psycopg 3
+                with cursor.copy(copy) as copy_stream:
+                    for row in data:
+                        copy_stream.write_row([row[col] for col in columns])
+
+            # DISTINCT ON keeps a single row per primary key, as ON CONFLICT can't update the same row twice
+            cursor.execute(f"INSERT INTO {target} ({column_list}) "
+                           f"SELECT DISTINCT ON ({key_list}) {column_list} FROM {staging} "
+                           f"ON CONFLICT ({key_list}) {conflict}")
+        finally:
+            cursor.close()
+
+    return len(data), time.perf_counter() - start
+
+
+def bulk_load(ORM, data):
+    """
+    upsert multiple rows into a given table the fastest way the database supports:
+    COPY through a staging table on PostgreSQL (see copy_upsert), batched executemany upserts on SQLite and MySQL (see bulk_upsert).
+
+    Args:
+    ORM: SQLAlchemy ORM class
+    data: either dictionary or list of dictionaries to be upserted into the database
+
+    Output:
+    a tuple of the amount of rows upserted and the seconds it took.
+    """
+
+    if engine.dialect.name == "postgresql":
+        return copy_upsert(ORM, data)
+    return bulk_upsert(ORM, data)
@@ -0,0 +1,102 @@
+import threading
+
+import pandas as pd
+
+import db_utils
+from models import Categories, Stores
+
+"""
+in-process cache of the keys of the dimension tables (Stores and Categories).
+The scraper labels the products with the names of their store and category, while the DailyData table references
+their IDs. Every process loads the mapping of a dimension table once; names that aren't in the table yet are created
+together in a single statement, so a new store location or category never ends up as a string in an integer column.
+Whole columns are resolved by mapping their distinct names only, so ingestion never looks up a key per row.
+"""
+
+
+class DimensionCache:
+    """
+    maps the names of a dimension table to their IDs and creates missing names in bulk.
+
+    Args:
+    ORM: SQLAlchemy ORM class of the dimension table.
+    key: the name of the ID column.
+    name: the name of the unique name column.
+    """
+
+    def __init__(self, ORM, key, name):
+        self.ORM = ORM
+        self.key = key
+        self.name = name
+        self.lock = threading.Lock()
+        self.keys = None # loaded on first use, so importing this module doesn't need a database connection
+
+
+    def load(self, names=None):
+        """
+        loads the IDs of the given names (or of all names) from the database into the cache.
+        """
+
+        key_column, name_column = getattr(self.ORM, self.key), getattr(self.ORM, self.name)
+        with db_utils.session_query() as session:
+            query = session.query(name_column, key_column)
+            if names is not None:
+                query = query.filter(name_column.in_(names))
+            self.keys.update(dict(query.all()))
+
+
+    def resolve(self, names):
+        """
+        returns the IDs of the given names. Names that don't exist yet are created in a single statement.
+
+        Args:
+        names: an iterable of names.
+
+        Output:
+        a dictionary of every name and its ID.
+        """
+
+        names = set(names)
+        with self.lock:
+            if self.keys is None:
+                self.keys = {}
+                self.load()
+            missing = sorted(name for name in names if name not in self.keys)
+            if missing:
+                db_utils.bulk_insert_missing(self.ORM, [{self.name: name} for name in missing])
+                self.load(missing)
+            return {name: self.keys[name] for name in names}
+
+
+    def get(self, name):
+        return self.resolve([name])[name]
+
+
+    def map(self, column):
+        """
+        replaces every name of a pandas column with its ID. Only the distinct names are looked up.
+
+        Args:
+        column: a pandas Series of names.
+
+        Output:
+        a pandas Series of IDs with the same index.
+        """
+
+        codes, uniques = pd.factorize(column)
+        mapping = self.resolve(uniques)
+        ids = pd.Index([mapping[name] for name in uniques], dtype="int64")
+        return pd.Series(ids.take(codes), index=column.index, name=column.name)
+
+
+## one cache per dimension table and process
+_stores = DimensionCache(Stores, "store_id", "store_name")
+_categories = DimensionCache(Categories, "category_id", "category_name")
+
+
+def get_store_keys():
+    return _stores
+
+
+def get_category_keys():
+    return _categories
@@ -0,0 +1,251 @@
+import re
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from grammage import parse_amount
+from product_buffer import ProductBuffer
+
+"""
+extractors that turn the raw HTML of a page of the REWE website into products.
+Every extractor returns the same products, they only differ in how the HTML is parsed.
+The extractor used by the Scraper class is set with the EXTRACTOR variable in the config file.
+"""
+
+## the class attributes that identify the elements of a product tile on the REWE website
+PRODUCT_TILE_CLASS = "search-service-product product plrProductGrid__tile"
+PRODUCT_NAME_CLASS = "LinesEllipsis"
+PRODUCT_PRICE_CLASS = "search-service-productPrice productPrice"
+PRODUCT_OFFER_PRICE_CLASS = "search-service-productOfferPrice productOfferPrice"
+PRODUCT_GRAMMAGE_CLASS = "productGrammage search-service-productGrammage"
+ORGANIC_BADGE_CLASS = "organicBadge badgeItem search-service-organicBadge search-service-badgeItem"
+PAGINATION_BUTTON_CLASS = "PostRequestGetFormButton paginationPage paginationPageLink"
+
+
+def add_product(products, meso_productid, input_value, name, listed_price, offer_price, grammage, has_bio_label):
+    """
+    cleans the raw values found in a product tile and adds the product to the product buffer of the page.
+    Shared by all extractors, so they only need to find the raw values.
+
+    Args:
+    products: the ProductBuffer of the page (see product_buffer.py).
+    meso_productid: the "data-productid" attribute of the "meso-data" element, None if not found.
+    input_value: the "value" attribute of the first "input" element, None if not found.
+    name: the text of the product name element, None if not found.
+    listed_price: the text of the regular price element, None if not found.
+    offer_price: the text of the reduced price element, None if not found.
+    grammage: the text of the grammage element, None if not found.
+    has_bio_label: True if the product tile contains an organic badge.
+    """
+
+    ## gets the unique product ID to be used as the primary key in the database entry for the product
+    product_id = None
+    if meso_productid and meso_productid.isdigit():  # ensures it's a valid integer string
+        product_id = int(meso_productid)
+    if not product_id: # if "meso-data" didn't work, tries to find the "input" element and extract "value"
+        if input_value and input_value.isdigit():  # ensures it's a valid integer string
+            product_id = int(input_value) if product_id else None
+
+    ## cleans the name of the product using regular expressions
+    name = re.sub(r"""[\"']""", "", name).strip() if name else None
+
+    ## turns the price of the product into a float
+    ## checks if the product has a reduced price and assigns either True or False to the "reduced price" data point of the product
+    if listed_price is not None:
+        is_on_offer = False
+    else:
+        is_on_offer = True
+        listed_price = offer_price
+    listed_price = float(listed_price.replace("€", "").replace(",",".").strip())
+
+    ## gets the listed amount of the product and its unit measurement
+    listed_amount = grammage if grammage is not None else "1 Stück"
+    listed_amount, listed_unit = parse_amount(listed_amount)
+
+    products.append(product_id, name, has_bio_label, listed_price, listed_amount, listed_unit, is_on_offer)
+
+
+class BeautifulSoupExtractor:
+    """
+    extracts the products by building a full BeautifulSoup tree of the page and searching every product tile
+    for each of its data points. This is the reference implementation that the other extractors are checked against.
+    """
+
+    name = "bs4"
+
+    def check_pagination(self, soup):
+        """
+        checks for pagination in the BeautifulSoup object.
+
+        args:
+        soup: BeautifulSoup Class
+
+        output:
+        either the last page of the website or 1 (meaning there is only one page)
+        """
+
+        lastpage = soup.find_all("button", class_=PAGINATION_BUTTON_CLASS)
+        if lastpage:
+            last_page = int(lastpage[-1].get_text(strip=True))
+            return last_page
+        else:
+            return 1
+
+
+    def extract(self, html, date, store, category, page):
+        """
+        extracts all products listed on a single page of the REWE website.
+
+        Args:
+        html: the raw HTML of the page.
+        date, store, category: the values of the respective DailyData columns for all products on the page.
+        page: the number of the page. The pagination is only checked on the first page.
+
+        Output:
+        a tuple of a ProductBuffer with the products structured after the DailyData ORM in the models.py script
+        and the last page found in the pagination (None if it isn't the first page).
+        """
+
+        soup = BeautifulSoup(html, "lxml")
+        last_page = self.check_pagination(soup) if page == 1 else None
+
+        products = ProductBuffer(date, store, category)
+        for item in soup.find_all("section", class_=PRODUCT_TILE_CLASS):
+            meso_data = item.find("meso-data")
+            input_element = item.find("input")
+            name = item.find("div", class_=PRODUCT_NAME_CLASS)
+            listed_price = item.find("div", class_=PRODUCT_PRICE_CLASS)
+            offer_price = item.find("div", class_=PRODUCT_OFFER_PRICE_CLASS)
+            grammage = item.find("div", class_=PRODUCT_GRAMMAGE_CLASS)
+            biolabel = item.find("div", class_=ORGANIC_BADGE_CLASS)
+
+            add_product(
+                products,
+                meso_productid=meso_data.get("data-productid") if meso_data else None,
+                input_value=input_element.get("value") if input_element else None,
+                name=name.text if name else None,
+                listed_price=listed_price.text if listed_price else None,
+                offer_price=offer_price.text if offer_price else None,
+                grammage=grammage.text if grammage else None,
+                has_bio_label=True if biolabel else False,
+            )
+
+        return products, last_page
+
+
+class LxmlExtractor:
+    """
+    extracts the products with lxml directly, without building a BeautifulSoup tree.
+    The product tiles are found with a single compiled XPath expression and every tile is walked only once,
+    picking up all of its data points on the way. Produces the same products as the BeautifulSoupExtractor.
+    """
+
+    name = "lxml"
+
+    find_tiles = etree.XPath(f'//section[normalize-space(@class)="{PRODUCT_TILE_CLASS}"]')
+    find_pagination = etree.XPath(f'//button[normalize-space(@class)="{PAGINATION_BUTTON_CLASS}"]')
+
+    ## maps the normalized class attribute of the div elements in a product tile to the data point they contain
+    div_fields = {
+        PRODUCT_PRICE_CLASS: "listed_price",
+        PRODUCT_OFFER_PRICE_CLASS: "offer_price",
+        PRODUCT_GRAMMAGE_CLASS: "grammage",
+        ORGANIC_BADGE_CLASS: "biolabel",
+    }
+
+    def __init__(self):
+        self.parser = etree.HTMLParser(encoding="utf-8")
+
+
+    def check_pagination(self, root):
+        """
+        checks for pagination in the lxml tree of the page.
+
+        output:
+        either the last page of the website or 1 (meaning there is only one page)
+        """
+
+        lastpage = self.find_pagination(root)
+        if lastpage:
+            return int("".join(text.strip() for text in lastpage[-1].itertext()))
+        else:
+            return 1
+
+
+    def read_tile(self, tile):
+        """
+        walks through all elements of a product tile once and keeps the first element found for each data point.
+
+        Output:
+        a dictionary of the data points and the elements they were found in.
+        """
+
+        found = {}
+        for element in tile.iterdescendants():
+            tag = element.tag
+            if tag == "div":
+                classes = element.get("class")
+                if not classes:
+                    continue
+                classes = classes.split()
+                field = self.div_fields.get(" ".join(classes))
+                if field is None and PRODUCT_NAME_CLASS in classes:
+                    field = "name"
+                if field is not None and field not in found:
+                    found[field] = element
+            elif tag == "meso-data" or tag == "input":
+                if tag not in found:
+                    found[tag] = element
+        return found
+
+
+    def extract(self, html, date, store, category, page):
+        """
+        extracts all products listed on a single page of the REWE website.
+        Takes the same arguments and returns the same output as BeautifulSoupExtractor.extract.
+        """
+
+        if isinstance(html, str):
+            html = html.encode("utf-8")
+        root = etree.fromstring(html, self.parser) if html.strip() else None
+        if root is None:
+            return ProductBuffer(date, store, category), (1 if page == 1 else None)
+
+        last_page = self.check_pagination(root) if page == 1 else None
+
+        products = ProductBuffer(date, store, category)
+        for tile in self.find_tiles(root):
+            found = self.read_tile(tile)
+            text = {field: element.xpath("string()") for field, element in found.items() if field in ("name", "listed_price", "offer_price", "grammage")}
+            meso_data = found.get("meso-data")
+            input_element = found.get("input")
+
+            add_product(
+                products,
+                meso_productid=meso_data.get("data-productid") if meso_data is not None else None,
+                input_value=input_element.get("value") if input_element is not None else None,
+                name=text.get("name"),
+                listed_price=text.get("listed_price"),
+                offer_price=text.get("offer_price"),
+                grammage=text.get("grammage"),
+                has_bio_label="biolabel" in found,
+            )
+
+        return products, last_page
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (BeautifulSoupExtractor, LxmlExtractor)}
+
+
+@lru_cache
+def get_extractor(name):
+    """
+    returns an instance of the extractor with the given name as listed in the EXTRACTORS dictionary.
+    The instance is created once per process and reused for every page.
+    """
+
+    try:
+        return EXTRACTORS[name]()
+    except KeyError:
+        raise ValueError(f"unknown extractor {name}. Choose one of: {', '.join(EXTRACTORS)}")
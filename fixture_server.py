@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from extractors import PAGINATION_BUTTON_CLASS
+
+"""
+local stand-in for the category pages of the REWE website, used to measure the scraper offline (see benchmark.py scraper).
+Serves captured category pages (<fixtures>/<category>/<page>.html) or synthetic pages with the same structure and pagination
+under the same URLs as the REWE website: /c/<category>/?objectsPerPage=250&page=<page>.
+The server can add latency to every response, answer a share of the requests with 429 "Too Many Requests" and
+drop a share of the connections without any response, which the scraper sees like a failed TLS connection.
+Responses carry an ETag, so conditional requests of the page cache are answered with 304 "Not Modified".
+
+usage:
+python fixture_server.py [--port N] [--fixtures DIR] [--categories N] [--pages N] [--latency S] [--error-rate P] [--reset-rate P]
+"""
+
+PAGE_URL = re.compile(r"^/c/(?P<category>[^/?]+)/?$")
+
+GRAMMAGES = ["500g", "1l", "6x0,33l", "250g (1 kg = 3,96 €)", "1 Stück", "0,75l", "2 x 100g", "1,5kg",
+             "330ml", "10 Stück", "4x125g", "1kg", "200ml (100 ml = 0,95 €)", "12 x 1l", "\"Aktion\" 400g"]
+
+
+def synthetic_tile(product_id, rng):
+    """
+    creates the HTML of a single product tile that is structured like the product tiles on the REWE website.
+    """
+
+    is_on_offer = rng.random() < 0.2
+    price = f"{rng.randint(0, 30)},{rng.randint(0, 99):02d} €"
+    price_class = "search-service-productOfferPrice productOfferPrice" if is_on_offer else "search-service-productPrice productPrice"
+    grammage = rng.choice(GRAMMAGES + [None])
+
+    tile = ['<section class="search-service-product product plrProductGrid__tile" data-testid="product-tile">',
+            f'<meso-data data-productid="{product_id}" data-mesomaterial="{product_id}"></meso-data>',
+            f'<a href="/p/produkt/{product_id}"><div class="search-service-productTitleWrapper">',
+            f'<div class="LinesEllipsis  search-service-productTitle">REWE Beste Wahl "Produkt" {product_id}<!-- comment --> <span>\'groß\'</span> </div></div></a>',
+            f'<div class="search-service-productPriceContainer"><div class="{price_class}">{price}</div></div>']
+    if grammage is not None:
+        tile.append(f'<div class="productGrammage search-service-productGrammage">{grammage}</div>')
+    if rng.random() < 0.15:
+        tile.append('<div class="search-service-badges"><div class="organicBadge badgeItem search-service-organicBadge search-service-badgeItem">Bio</div></div>')
+    tile.append(f'<form><input type="hidden" name="productId" value="{product_id}"/><button type="submit">In den Warenkorb</button></form></section>')
+    return "".join(tile)
+
+
+def synthetic_page(page, last_page, products_per_page=250, seed=0):
+    """
+    creates the HTML of a category page that is structured like the category pages of the REWE website,
+    including the product grid and the pagination buttons.
+
+    Args:
+    page: the number of the page, used to create distinct product IDs on every page.
+    last_page: the amount of pages of the category, used for the pagination buttons.
+    products_per_page: the amount of product tiles on the page.
+    seed: seed for the random data points of the products.
+    """
+
+    rng = random.Random(seed * 100_000 + page)
+    tiles = "".join(synthetic_tile(seed * 1_000_000 + page * products_per_page + i, rng) for i in range(products_per_page))
+    navigation = '<a href="/c/kategorie">Kategorie</a>' * 50
+    pagination = "".join(f'<button class="{PAGINATION_BUTTON_CLASS}" type="submit"> {i} </button>' for i in range(1, last_page + 1)) if last_page > 1 else ""
+    return ("<!DOCTYPE html><html lang=\"de\"><head><meta charset=\"utf-8\"><title>REWE Onlineshop</title>"
+            "<script>window.__INITIAL_STATE__ = {\"products\": []};</script></head><body>"
+            f"<header><nav>{navigation}</nav></header>"
+            f"<main><div class=\"search-service-rsTiles plrProductGrid\">{tiles}</div>"
+            f"<div class=\"paginationContainer\">{pagination}</div></main>"
+            f"<footer>{'<p>Impressum</p>' * 50}</footer></body></html>")
+
+
+class FixturePages:
+    """
+    the pages served by the stand-in server, either loaded from captured HTML files or created synthetically.
+
+    Args:
+    fixtures: a folder with one subfolder of HTML files (1.html, 2.html, ...) per category, None for synthetic pages.
+    categories: the amount of synthetic categories (named category-1, category-2, ...).
+    pages: the amount of pages of every synthetic category.
+    products_per_page: the amount of products on every synthetic page.
+    """
+
+    def __init__(self, fixtures=None, categories=4, pages=5, products_per_page=250):
+        self.pages = {}
+        if fixtures:
+            for folder in sorted(Path(fixtures).iterdir()):
+                if folder.is_dir():
+                    for file in folder.glob("*.html"):
+                        self.pages[(folder.name, int(file.stem))] = file.read_bytes()
+            if not self.pages:
+                raise FileNotFoundError(f"no category pages found in {fixtures}")
+        else:
+            for category in range(1, categories + 1):
+                for page in range(1, pages + 1):
+                    self.pages[(f"category-{category}", page)] = synthetic_page(page, pages, products_per_page, seed=category).encode("utf-8")
+        self.etags = {key: f'"{hashlib.sha1(html).hexdigest()}"' for key, html in self.pages.items()}
+        self.last_pages = {}
+        for category, page in self.pages:
+            self.last_pages[category] = max(page, self.last_pages.get(category, 0))
+
+
+    def categories(self):
+        return sorted(self.last_pages)
+
+
+    def get(self, category, page):
+        """
+        returns the HTML and ETag of a page. Like on the REWE website, pages beyond the last page show the last page.
+        """
+
+        if category not in self.last_pages:
+            return None, None
+        key = (category, min(page, self.last_pages[category]))
+        return self.pages[key], self.etags[key]
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """
+    threaded HTTP server that serves FixturePages.
+
+    Args:
+    address: tuple of host and port, port 0 picks a free port.
+    pages: the FixturePages to be served.
+    latency: the average seconds every response is delayed by (randomized between 50% and 150%).
+    error_rate: the share of requests answered with 429 "Too Many Requests".
+    reset_rate: the share of connections that are dropped without a response.
+    retry_after: the value of the Retry-After header of the 429 responses.
+    seed: seed for the random failures, so benchmark runs are comparable.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, pages, latency=0.0, error_rate=0.0, reset_rate=0.0, retry_after=0.5, seed=0):
+        super().__init__(address, FixtureRequestHandler)
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "pages": 0, "not_modified": 0, "errors": 0, "resets": 0, "bytes": 0}
+
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def count(self, **counters):
+        with self.lock:
+            for counter, value in counters.items():
+                self.counters[counter] += value
+
+
+    def draw(self):
+        with self.lock:
+            return self.rng.random(), self.rng.uniform(0.5, 1.5)
+
+
+    def start(self):
+        """
+        serves the pages in a background thread until shutdown is called.
+        """
+
+        thread = threading.Thread(target=self.serve_forever, name="fixture-server", daemon=True)
+        thread.start()
+        return self
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keeps connections alive like the REWE website
+
+    def do_GET(self):
+        server = self.server
+        server.count(requests=1)
+        failure, jitter = server.draw()
+        if server.latency:
+            time.sleep(server.latency * jitter)
+
+        if failure < server.reset_rate:
+            server.count(resets=1)
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+            return
+
+        if failure < server.reset_rate + server.error_rate:
+            server.count(errors=1)
+            self.send_response(429)
+            self.send_header("Retry-After", str(server.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        url = urlparse(self.path)
+        match = PAGE_URL.match(url.path)
+        page = parse_qs(url.query).get("page", ["1"])[0]
+        html, etag = server.pages.get(match.group("category"), int(page)) if match and page.isdigit() else (None, None)
+        if html is None:
+            self.send_error(404)
+            return
+
+        if self.headers.get("If-None-Match") == etag:
+            server.count(not_modified=1)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        server.count(pages=1, bytes=len(html))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(html)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local stand-in server for the category pages of the REWE website")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fixtures", help="folder with one subfolder of captured pages (1.html, 2.html, ...) per category")
+    parser.add_argument("--categories", type=int, default=4, help="amount of synthetic categories if no fixtures are given")
+    parser.add_argument("--pages", type=int, default=5, help="amount of pages per synthetic category")
+    parser.add_argument("--latency", type=float, default=0.0, help="average seconds every response is delayed by")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="share of connections dropped without a response")
+    args = parser.parse_args()
+
+    pages = FixturePages(args.fixtures, args.categories, args.pages)
+    server = FixtureServer((args.host, args.port), pages, args.latency, args.error_rate, args.reset_rate)
+    print(f"serving {len(pages.pages)} pages of {len(pages.categories())} categories on {server.url}/c/<category>/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
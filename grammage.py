@@ -0,0 +1,120 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+"""
+parses the grammage listed for a product on the REWE website (e.g. "500g", "1l" or "6x0,33l") into the amount and the unit of the product.
+The same few hundred grammage strings repeat thousands of times per run, so parse_amount caches its results and
+parse_amounts only parses every distinct string of a column once, in a single vectorized pass over all of them.
+Both functions return exactly the same results.
+"""
+
+UNITS = ["g", "ml", "kg", "l"] # later units in the list take precedence over earlier ones if several of them are found
+
+## precompiled patterns shared by parse_amount and parse_amounts
+REMOVED_CHARACTERS = re.compile(r"""[\"']|\(.*?\)""")
+WHITESPACE = re.compile(r"\s+")
+NUMBER = re.compile(r"\d+(\,\d+)?")
+NUMBER_BEFORE_UNIT = {unit: re.compile(rf"(\d+)(?={unit})") for unit in UNITS}
+MULTIPLIER = re.compile(r"\d+(?=x)")
+
+
+def clean_amount(amount):
+    """
+    removes quotes, anything in brackets and all whitespace from the amount.
+    """
+
+    return WHITESPACE.sub("", REMOVED_CHARACTERS.sub("", amount).strip())
+
+
+@lru_cache(maxsize=4096)
+def parse_amount(amount):
+    """
+    takes the amount scraped from the website and parses it for mentions of any typically
+    found standard units like gramm or liter and extracts the listed amount and unit accordingly.
+    Results are cached, so every distinct amount is only parsed once per process.
+
+    Args:
+    amount: a string derived from the product tile that mentions the amount of a product.
+
+    Output:
+    listed_amount: a float that only lists the amount of the product.
+    listed_unit: a string that only lists the unit of the product.
+    """
+
+    amount_cleaned = clean_amount(amount)
+    listed_amount = None
+    listed_unit = None
+
+    for unit in UNITS:
+        search_unit = NUMBER_BEFORE_UNIT[unit].search(amount_cleaned)
+        if search_unit:
+            if "," in amount_cleaned:
+                listed_amount = float(NUMBER.search(amount_cleaned).group().replace(",", "."))
+            else:
+                listed_amount = float(search_unit.group(1))
+            listed_unit = unit
+
+    if not listed_amount:
+        listed_amount = 1.0
+        listed_unit = "piece"
+
+    multiplier = MULTIPLIER.search(amount_cleaned)
+    if multiplier:
+        listed_amount = float(multiplier.group()) * float(listed_amount)
+
+    return listed_amount, listed_unit
+
+
+def to_float(numbers):
+    """
+    turns a series of number strings (with NaN for missing numbers) into floats the same way the float function does.
+    """
+
+    return numbers.map(float, na_action="ignore").astype(float)
+
+
+def parse_amounts(amounts):
+    """
+    vectorized version of parse_amount for a whole column of amounts.
+    Every distinct amount is only parsed once and the results are mapped back onto the column.
+
+    Args:
+    amounts: a pandas series or list of strings. Missing values are treated like a product without a listed amount ("1 Stück").
+
+    Output:
+    a pandas dataframe with the columns "listed_amount" and "listed_unit", aligned with the index of the amounts.
+    """
+
+    amounts = pd.Series(amounts, dtype=object)
+    codes, uniques = pd.factorize(amounts.fillna("1 Stück"))
+    cleaned = (pd.Series(uniques, dtype=object)
+               .str.replace(REMOVED_CHARACTERS, "", regex=True)
+               .str.strip()
+               .str.replace(WHITESPACE, "", regex=True))
+
+    has_comma = cleaned.str.contains(",", regex=False)
+    first_number = to_float(cleaned.str.extract(rf"({NUMBER.pattern})", expand=True)[0].str.replace(",", ".", regex=False))
+
+    listed_amount = pd.Series(np.nan, index=cleaned.index)
+    listed_unit = pd.Series(None, index=cleaned.index, dtype=object)
+    for unit in UNITS:
+        number_before_unit = cleaned.str.extract(NUMBER_BEFORE_UNIT[unit], expand=True)[0]
+        found = number_before_unit.notna()
+        value = to_float(number_before_unit).where(~has_comma, first_number)
+        listed_amount[found] = value[found]
+        listed_unit[found] = unit
+
+    no_amount = listed_amount.isna() | (listed_amount == 0)
+    listed_amount[no_amount] = 1.0
+    listed_unit[no_amount] = "piece"
+
+    multiplier = to_float(cleaned.str.extract(rf"({MULTIPLIER.pattern})", expand=True)[0])
+    listed_amount = (multiplier * listed_amount).where(multiplier.notna(), listed_amount)
+
+    return pd.DataFrame({
+        "listed_amount": listed_amount.to_numpy()[codes],
+        "listed_unit": listed_unit.to_numpy()[codes],
+    }, index=amounts.index)
@@ -0,0 +1,440 @@
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from multiprocessing.managers import SyncManager
+from urllib.parse import urlparse
+
+from config import (
+    REQUESTS_PER_SECOND, 
+    REQUEST_BURST, 
+    ADAPTIVE_RATE, 
+    AIMD_INCREASE, 
+    AIMD_DECREASE, 
+    AIMD_MIN_RATE, 
+    AIMD_MAX_RATE, 
+    LATENCY_SPIKE_FACTOR, 
+    LATENCY_SPIKE_MIN_SAMPLES, 
+    RATE_LIMITS_FILE
+)
+
+
+class TokenBucket:
+    """
+    thread-safe token bucket that limits how many HTTP requests can be sent to a host.
+    Tokens refill continuously at the given rate up to the capacity of the bucket, and
+    every request has to take one token before it is sent.
+
+    Args:
+    rate: amount of tokens (requests) that get added to the bucket per second.
+    capacity: maximum amount of tokens the bucket can hold, i.e. the largest allowed burst of requests.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def refill(self):
+        """
+        adds the tokens accumulated since the last refill. Must be called while holding the lock.
+        """
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def acquire(self):
+        """
+        blocks until a token is available and takes it.
+
+        Output:
+        the amount of seconds spent waiting for the token.
+        """
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+    def set_rate(self, rate):
+        """
+        changes the rate of the bucket. The tokens accumulated so far are kept.
+        """
+
+        with self.lock:
+            self.refill()
+            self.rate = rate
+
+
+class AdaptiveRateController:
+    """
+    adjusts the rate of the token bucket of a host to the fastest rate the host tolerates (AIMD).
+    While the responses are healthy, the rate increases additively by AIMD_INCREASE requests per second every second.
+    Responses with the status code 429 or 503, Cloudflare challenge pages and latency spikes cut the rate by the factor AIMD_DECREASE.
+    Responses to requests that were sent before the last cut are ignored, so a single burst of errors only cuts the rate once.
+
+    Args:
+    host: the host whose requests are controlled.
+    rate: the initial rate in requests per second, usually the rate learned during the previous run.
+    adaptive: if False, the rate stays fixed and responses are ignored.
+    """
+
+    def __init__(self, host, rate, adaptive=True):
+        self.host = host
+        self.bucket = TokenBucket(rate, REQUEST_BURST)
+        self.adaptive = adaptive
+        self.latency = None # exponentially weighted moving average of the response times
+        self.samples = 0
+        self.decreased_at = 0.0
+        self.lock = threading.Lock()
+
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+
+    def acquire(self):
+        """
+        blocks until the token bucket allows the next request.
+
+        Output:
+        the time at which the request is sent, to be passed on to record_response or record_failure.
+        """
+
+        self.bucket.acquire()
+        return time.monotonic()
+
+
+    def record_response(self, sent_at, status_code, challenge=False):
+        """
+        adjusts the rate based on the response to a request.
+
+        Args:
+        sent_at: the time returned by acquire when the request was sent.
+        status_code: the status code of the response.
+        challenge: True if the response was a Cloudflare challenge page instead of the requested page.
+        """
+
+        latency = time.monotonic() - sent_at
+        with self.lock:
+            spike = (self.samples >= LATENCY_SPIKE_MIN_SAMPLES and latency > self.latency * LATENCY_SPIKE_FACTOR)
+            self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+            self.samples += 1
+
+        if status_code in (429, 503) or challenge or spike:
+            self.decrease(sent_at)
+        else:
+            self.increase()
+
+
+    def record_failure(self, sent_at):
+        """
+        adjusts the rate after a request failed without a response (e.g. connection errors).
+        """
+
+        self.decrease(sent_at)
+
+
+    def increase(self):
+        if not self.adaptive:
+            return
+        with self.lock:
+            rate = self.bucket.rate
+            ## every response adds AIMD_INCREASE / rate, which adds up to AIMD_INCREASE per second at the current rate
+            self.bucket.set_rate(min(AIMD_MAX_RATE, rate + AIMD_INCREASE / rate))
+
+
+    def decrease(self, sent_at):
+        if not self.adaptive:
+            return
+        with self.lock:
+            if sent_at < self.decreased_at:
+                return
+            self.decreased_at = time.monotonic()
+            self.bucket.set_rate(max(AIMD_MIN_RATE, self.bucket.rate * AIMD_DECREASE))
+
+
+def is_challenge(response):
+    """
+    checks if a response is a Cloudflare challenge page instead of the requested page.
+    """
+
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    if response.status_code in (403, 503):
+        head = response.text[:5000]
+        return "Just a moment..." in head or "challenge-platform" in head
+    return False
+
+
+## one rate controller (and token bucket) per host, shared by every scraper running in this process
+_controllers = {}
+_controllers_lock = threading.Lock()
+_shared = None # the registry of the main process if this is a worker process of the parallel mode, see use_shared_rate_limiters
+
+
+def load_learned_rates():
+    """
+    loads the request rates per host that were learned during previous runs.
+    """
+
+    try:
+        with open(RATE_LIMITS_FILE) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def current_rates():
+    """
+    returns the current request rate of every host controlled in this process.
+    """
+
+    with _controllers_lock:
+        return {host: controller.rate for host, controller in _controllers.items()}
+
+
+def save_learned_rates(rates=None):
+    """
+    saves the current request rate of every host, so the next run starts at the rate the host tolerated during this run.
+    Worker processes of the parallel mode don't save anything, the main process saves the rates of the shared registry.
+
+    Args:
+    rates: a dictionary of hosts and their rates, defaults to the rates of the controllers of this process.
+    """
+
+    if not ADAPTIVE_RATE or _shared is not None:
+        return
+    if rates is None:
+        rates = current_rates()
+    learned = load_learned_rates()
+    learned.update({host: round(rate, 4) for host, rate in rates.items()})
+    rates = learned
+    os.makedirs(os.path.dirname(RATE_LIMITS_FILE) or ".", exist_ok=True)
+    with open(RATE_LIMITS_FILE, "w") as file:
+        json.dump(rates, file, indent=4)
+
+
+def get_rate_limiter(url):
+    """
+    returns the rate controller of the host of the given URL and creates it if it does not exist yet.
+    All scrapers sending requests to the same host share the same token bucket, so the total request
+    volume stays below the rate limit of the website no matter how many requests are in flight.
+    If ADAPTIVE_RATE is enabled, the rate starts at the rate learned during the previous run.
+
+    Args:
+    url: the URL (or bare host name) that a request will be sent to.
+    """
+
+    host = urlparse(url).netloc or url
+    with _controllers_lock:
+        if _shared is not None:
+            return SharedRateLimiter(_shared, host)
+        if host not in _controllers:
+            rate = load_learned_rates().get(host, REQUESTS_PER_SECOND) if ADAPTIVE_RATE else REQUESTS_PER_SECOND
+            _controllers[host] = AdaptiveRateController(host, rate, adaptive=ADAPTIVE_RATE)
+        return _controllers[host]
+
+
+class RateLimiterRegistry:
+    """
+    gives other processes access to the rate controllers of the process it lives in.
+    Runs inside the manager process of the parallel mode (see RateLimiterManager), so the worker processes
+    of all stores draw from the same token bucket per host instead of multiplying the request rate.
+    """
+
+    def acquire(self, host):
+        return get_rate_limiter(host).acquire()
+
+
+    def record_response(self, host, sent_at, status_code, challenge=False):
+        get_rate_limiter(host).record_response(sent_at, status_code, challenge)
+
+
+    def record_failure(self, host, sent_at):
+        get_rate_limiter(host).record_failure(sent_at)
+
+
+    def rates(self):
+        return current_rates()
+
+
+class SharedRateLimiter:
+    """
+    stands in for the rate controller of a host inside a worker process and forwards every call to the registry.
+    """
+
+    def __init__(self, registry, host):
+        self.registry = registry
+        self.host = host
+
+
+    def acquire(self):
+        return self.registry.acquire(self.host)
+
+
+    def record_response(self, sent_at, status_code, challenge=False):
+        self.registry.record_response(self.host, sent_at, status_code, challenge)
+
+
+    def record_failure(self, sent_at):
+        self.registry.record_failure(self.host, sent_at)
+
+
+class RateLimiterManager(SyncManager):
+    """
+    manager process of the parallel mode, which also holds the shared RateLimiterRegistry.
+    """
+
+
+RateLimiterManager.register("RateLimiterRegistry", RateLimiterRegistry)
+
+
+def use_shared_rate_limiters(registry):
+    """
+    makes every rate limiter of this (worker) process forward to the given registry proxy.
+    """
+
+    global _shared
+    with _controllers_lock:
+        _shared = registry
+
+
+def parse_retry_after(value):
+    """
+    parses the Retry-After header of a response, which is either an amount of seconds or an HTTP date.
+
+    Output:
+    the amount of seconds to wait before retrying, or None if the header is missing or invalid.
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    calculates how long to wait before retrying a failed request: exponential backoff with random jitter,
+    so that several failed requests don't all retry at the same moment.
+
+    Args:
+    max_attempts: amount of failed attempts after which a request is given up.
+    base_delay: seconds to wait after the first failed attempt. Doubles with every further attempt.
+    max_delay: upper limit for the seconds to wait.
+    jitter: fraction of the delay that gets randomized, e.g. 0.5 waits between 50% and 100% of the delay.
+    """
+
+    def __init__(self, max_attempts, base_delay, max_delay, jitter):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+
+    def delay(self, attempt, retry_after=None):
+        """
+        returns the seconds to wait before the next attempt.
+
+        Args:
+        attempt: the amount of failed attempts so far, starting at 1.
+        retry_after: the seconds requested by the server in the Retry-After header, which take precedence over the backoff.
+        """
+
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+class CircuitBreaker:
+    """
+    pauses all requests of a single store after too many consecutive failures.
+    Once the cooldown is over, requests are sent again. The next success closes the circuit breaker,
+    the next failure opens it again for another cooldown.
+
+    Args:
+    threshold: amount of consecutive failures that open the circuit breaker.
+    cooldown: seconds that the requests are paused for once the circuit breaker is open.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0 # consecutive failures since the last success
+        self.trips = 0 # times the circuit breaker opened since the last success
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trips = 0
+            self.opened_at = None
+
+
+    def record_failure(self):
+        """
+        counts a failed request and opens the circuit breaker if the threshold is reached.
+
+        Output:
+        True if the circuit breaker was opened by this failure.
+        """
+
+        with self.lock:
+            self.failures += 1
+            now = time.monotonic()
+            cooled_down = self.opened_at is None or now >= self.opened_at + self.cooldown
+            if self.failures >= self.threshold and cooled_down:
+                self.opened_at = now
+                self.trips += 1
+                return True
+            return False
+
+
+    def remaining(self):
+        """
+        returns the seconds until the cooldown of the circuit breaker is over, 0 if requests are allowed.
+        """
+
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+
+    def wait(self, stop_event):
+        """
+        blocks while the circuit breaker is open, or until the given threading.Event is set.
+        """
+
+        remaining = self.remaining()
+        while remaining > 0 and not stop_event.wait(remaining):
+            remaining = self.remaining()
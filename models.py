@@ -5,6 +5,8 @@ from sqlalchemy import (
     DECIMAL,
     Boolean,
     Date,
+    Float,
+    Text,
     ForeignKey,
     PrimaryKeyConstraint
 )
@@ -134,4 +136,28 @@ class CategoryStatistics(Base):
     percentage_reduced_products = Column(DECIMAL(10, 4))
     
     green_premium = Column(DECIMAL(10, 4), nullable=True) ## average price difference between the average product with a bio label relative to the median price
-    average_savings = Column(DECIMAL(10, 4)) ## average price difference between the average product with a reduced price relative to the median price
\ No newline at end of file
+    average_savings = Column(DECIMAL(10, 4)) ## average price difference between the average product with a reduced price relative to the median price
+
+class PriceSummaries(Base):
+    __tablename__ = "price_summaries"
+    __table_args__ = (
+        PrimaryKeyConstraint('date', 'store_id', 'category_id'),
+    )
+
+    date = Column(Date, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("stores.store_id"), primary_key=True, index=True)
+    category_id = Column(Integer, ForeignKey("categories.category_id"), primary_key=True, nullable=False, index=True)
+
+    amount_total_products = Column(Integer)
+    amount_bio_products = Column(Integer)
+    amount_reduced_products = Column(Integer)
+
+    price_count = Column(Integer) ## amount of products with a price
+    price_min = Column(Float)
+    price_max = Column(Float)
+    price_mean = Column(Float)
+    price_m2 = Column(Float) ## sum of the squared deviations from the mean
+    price_m3 = Column(Float) ## sum of the cubed deviations from the mean
+    price_sketch = Column(Text) ## quantile sketch of all prices (see summaries.py)
+    bio_price_sketch = Column(Text) ## quantile sketch of the prices of the products with a bio label
+    regular_price_sketch = Column(Text) ## quantile sketch of the prices of the products that are not on offer
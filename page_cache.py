@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import date
+
+from product_buffer import ProductBuffer
+
+"""
+on-disk cache of the pages scraped from the REWE website, used by the Scraper class to skip parsing pages that haven't changed since the previous run.
+For every (store, category, page) the cache keeps the content hash of the page and the ETag and Last-Modified headers of the response.
+The extracted products are stored once per content hash, so identical pages of different stores or days share the same entry.
+Extractions that no page refers to anymore are deleted whenever a scraper closes the cache.
+"""
+
+## only the product grid and the pagination matter for the extracted products, so scripts and everything
+## before the product grid (header, navigation, tracking data) are left out of the content hash
+PRODUCT_GRID_MARKER = "plrProductGrid"
+SCRIPT_BLOCKS = re.compile(r"<script\b.*?</script>", re.DOTALL | re.IGNORECASE)
+
+
+def content_hash(html, extractor):
+    """
+    creates the hash that identifies the content of a page.
+
+    Args:
+    html: the raw HTML of the page.
+    extractor: the name of the extractor, so products extracted by different extractors are never mixed up.
+    """
+
+    start = html.find(PRODUCT_GRID_MARKER)
+    content = SCRIPT_BLOCKS.sub("", html[start:] if start != -1 else html)
+    return hashlib.sha256(f"{extractor}\n{content}".encode("utf-8")).hexdigest()
+
+
+class CachedPage:
+    """
+    the cache entry of a single page.
+    """
+
+    def __init__(self, digest, etag, last_modified, last_page, archived=None):
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.last_page = last_page
+        self.archived = date.fromisoformat(archived) if archived else None # the day the last full response was archived (see archive.py)
+
+
+    def conditional_headers(self):
+        """
+        headers for a conditional request, which lets the server answer with 304 "Not Modified" if the page hasn't changed.
+        """
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    SQLite backed page cache that can be shared by the fetch threads and the scrape loop of a Scraper.
+
+    Args:
+    path: the location of the SQLite file of the cache.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    store TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    last_page INTEGER,
+                    archived TEXT,
+                    PRIMARY KEY (store, category, page)
+                )""")
+            # caches created before the archive date was tracked
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(pages)")]
+            if "archived" not in columns:
+                self.connection.execute("ALTER TABLE pages ADD COLUMN archived TEXT")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS extractions (
+                    digest TEXT PRIMARY KEY,
+                    products TEXT NOT NULL
+                )""")
+
+
+    def lookup(self, store, category, page):
+        """
+        returns the cache entry of the given page, or None if the page has never been cached.
+        """
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT digest, etag, last_modified, last_page, archived FROM pages WHERE store = ? AND category = ? AND page = ?",
+                (store, category, page)
+            ).fetchone()
+        return CachedPage(*row) if row else None
+
+
+    def load_products(self, digest, date, store, category):
+        """
+        loads the products extracted from the page with the given content hash.
+
+        Args:
+        digest: the content hash of the page.
+        date, store, category: the values of the respective DailyData columns for all products on the page.
+
+        Output:
+        a ProductBuffer with the products structured after the DailyData ORM in the models.py script, or None if the products aren't cached.
+        """
+
+        with self.lock:
+            row = self.connection.execute("SELECT products FROM extractions WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        return ProductBuffer.from_records(date, store, category, json.loads(row[0]))
+
+
+    def store(self, store, category, page, digest, etag, last_modified, last_page, products, archived=None):
+        """
+        saves the content hash, the response headers and the extracted products of a page.
+        archived is the day the response was archived on, if it was.
+        """
+
+        products = json.dumps(list(products.records(dimensions=False)))
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO extractions (digest, products) VALUES (?, ?)",
+                (digest, products)
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (store, category, page, digest, etag, last_modified, last_page, archived) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (store, category, page, digest, etag, last_modified, last_page, archived.isoformat() if archived else None)
+            )
+
+
+    def mark_archived(self, store, category, page, archived):
+        """
+        records that the full response of a cached page was archived on the given day.
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE pages SET archived = ? WHERE store = ? AND category = ? AND page = ?",
+                (archived.isoformat(), store, category, page)
+            )
+
+
+    def prune(self):
+        """
+        deletes the extracted products that no page refers to anymore, e.g. those of the earlier versions of changed pages.
+
+        Output:
+        the amount of deleted extractions.
+        """
+
+        with self.lock, self.connection:
+            return self.connection.execute("DELETE FROM extractions WHERE digest NOT IN (SELECT digest FROM pages)").rowcount
+
+
+    def close(self):
+        """
+        prunes the extractions that aren't needed anymore and closes the connection.
+        """
+
+        self.prune()
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,169 @@
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+"""
+columnar export of the scraped products as a Parquet dataset, partitioned by date, store and category:
+data/parquet/date=<date>/store=<store>/category=<category>/part-<run>.parquet
+The Scraper class appends every page to the export as soon as it is certain that the page exists, and every partition
+is written in row groups of PARQUET_ROW_GROUP_SIZE products, so the export doesn't need to hold a whole store in memory.
+A partition is only replaced once its store has been scraped completely, so readers never see a partially written store.
+read_export loads a range of days into a pandas dataframe and only reads the partitions that match the filters.
+"""
+
+## the columns of the Parquet files. The date, store and category are part of the path of every file
+SCHEMA = pa.schema([
+    ("product_id", pa.int64()),
+    ("product_name", pa.string()),
+    ("has_bio_label", pa.bool_()),
+    ("listed_price", pa.float64()),
+    ("listed_amount", pa.float64()),
+    ("listed_unit", pa.dictionary(pa.int8(), pa.string())),
+    ("is_on_offer", pa.bool_()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.date32()), ("store", pa.string()), ("category", pa.string())]), flavor="hive")
+
+
+def partition_value(value):
+    """
+    turns a store or category name into a file system friendly partition value.
+    """
+
+    return re.sub(r"\W+", "_", str(value)).strip("_").lower()
+
+
+def to_table(products):
+    """
+    turns a ProductBuffer (see product_buffer.py) into a pyarrow table, using its typed columns without copying them.
+    """
+
+    return pa.table({
+        "product_id": pa.array(products.product_id, type=pa.int64()),
+        "product_name": pa.array(products.product_name, type=pa.string()),
+        "has_bio_label": pa.array(np.frombuffer(products.has_bio_label, dtype=np.int8).view(np.bool_)),
+        "listed_price": pa.array(np.frombuffer(products.listed_price, dtype=np.float64)),
+        "listed_amount": pa.array(np.frombuffer(products.listed_amount, dtype=np.float64)),
+        "listed_unit": pa.array(products.listed_unit, type=pa.string()).dictionary_encode().cast(SCHEMA.field("listed_unit").type),
+        "is_on_offer": pa.array(np.frombuffer(products.is_on_offer, dtype=np.int8).view(np.bool_)),
+    }, schema=SCHEMA)
+
+
+class ParquetExport:
+    """
+    appends the products of the pages of a single store to the partitions of their categories.
+
+    Args:
+    path: the root folder of the Parquet dataset.
+    today: the date of the run.
+    store: the store location.
+    logger: the logger of the Application the scraper belongs to.
+    row_group_size: the amount of products that are buffered per category before they are written as a row group.
+    """
+
+    def __init__(self, path, today, store, logger, row_group_size):
+        self.folder = os.path.join(path, f"date={today.isoformat()}", f"store={partition_value(store)}")
+        self.part = f"part-{datetime.now().strftime('%H%M%S')}-{os.getpid()}.parquet"
+        self.logger = logger
+        self.row_group_size = row_group_size
+        self.writers = {} # one Parquet writer per category, writing to a hidden temporary file until the export is committed
+        self.buffers = {} # the tables of every category that haven't been written yet
+        self.seen = {} # the product IDs of every category, so products listed on several pages are only exported once
+
+
+    def add(self, products):
+        """
+        appends the products of a page to the partition of its category.
+
+        Args:
+        products: the ProductBuffer of a page.
+        """
+
+        category = products.category
+        seen = self.seen.setdefault(category, set())
+        keep = []
+        for product_id in products.product_id:
+            keep.append(product_id not in seen)
+            seen.add(product_id)
+        table = to_table(products).filter(pa.array(keep, type=pa.bool_()))
+        buffered = self.buffers.setdefault(category, [])
+        buffered.append(table)
+        if sum(len(table) for table in buffered) >= self.row_group_size:
+            self.flush(category)
+
+
+    def flush(self, category):
+        """
+        writes the buffered products of a category as a row group.
+        """
+
+        tables = self.buffers.pop(category, [])
+        if not tables:
+            return
+        if category not in self.writers:
+            folder = os.path.join(self.folder, f"category={partition_value(category)}")
+            os.makedirs(folder, exist_ok=True)
+            self.writers[category] = pq.ParquetWriter(os.path.join(folder, f".{self.part}.tmp"), SCHEMA, compression="zstd")
+        self.writers[category].write_table(pa.concat_tables(tables), row_group_size=self.row_group_size)
+
+
+    def close(self, commit=True):
+        """
+        finishes the files of all categories. If commit is True, they replace the files of earlier runs of the same day,
+        otherwise (e.g. if the scrape was aborted) they are deleted and the earlier files are kept.
+        """
+
+        if commit:
+            for category in list(self.buffers):
+                self.flush(category)
+        for category, writer in self.writers.items():
+            writer.close()
+            folder = os.path.dirname(writer.where)
+            if commit:
+                os.replace(writer.where, os.path.join(folder, self.part))
+                for file in os.listdir(folder):
+                    if file != self.part:
+                        os.remove(os.path.join(folder, file))
+            else:
+                os.remove(writer.where)
+        if commit:
+            self.logger.info("exported %s categories to %s", len(self.writers), self.folder)
+        self.writers = {}
+        self.buffers = {}
+
+
+def read_export(path, start=None, end=None, stores=None, categories=None, columns=None):
+    """
+    loads the exported products of a range of days into a pandas dataframe. Only the partitions matching
+    the filters are read.
+
+    Args:
+    path: the root folder of the Parquet dataset.
+    start, end: the first and last date to be loaded (datetime.date), None for no limit.
+    stores, categories: lists of store locations or category names to be loaded, None for all of them.
+    columns: the columns to be loaded, None for all columns including date, store and category.
+
+    Output:
+    a pandas dataframe of the products.
+    """
+
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field("date") >= start)
+    if end is not None:
+        conditions.append(ds.field("date") <= end)
+    if stores is not None:
+        conditions.append(ds.field("store").isin([partition_value(store) for store in stores]))
+    if categories is not None:
+        conditions.append(ds.field("category").isin([partition_value(category) for category in categories]))
+
+    condition = None
+    for other in conditions:
+        condition = other if condition is None else condition & other
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
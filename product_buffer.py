@@ -0,0 +1,173 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+"""
+columnar buffer for the products extracted from the REWE website.
+Instead of one dictionary per product, every data point is kept in its own column: prices and amounts in typed arrays,
+flags in byte arrays and names and units in lists. The date, store and category are the same for every product of a page
+and are therefore stored only once per buffer. The buffer pickles compactly (which matters for the parser processes)
+and turns into a pandas dataframe column by column, without building a dictionary for every product.
+"""
+
+## the columns of the DailyData ORM in the models.py script, in the order of the dataframes created by the Scraper class
+COLUMNS = ("date", "store_id", "product_id", "product_name", "has_bio_label", "category_id",
+           "listed_price", "listed_amount", "listed_unit", "is_on_offer")
+
+
+class ProductBuffer:
+    """
+    the products of a single category of a store on a single date, stored column by column.
+
+    Args:
+    date, store, category: the values of the respective DailyData columns for all products in the buffer.
+    """
+
+    __slots__ = ("date", "store", "category", "product_id", "product_name", "has_bio_label",
+                 "listed_price", "listed_amount", "listed_unit", "is_on_offer")
+
+    def __init__(self, date, store, category):
+        self.date = date
+        self.store = store
+        self.category = category
+        self.product_id = [] # a list instead of an array, products without a valid ID are kept as None
+        self.product_name = []
+        self.has_bio_label = array("b")
+        self.listed_price = array("d")
+        self.listed_amount = array("d")
+        self.listed_unit = []
+        self.is_on_offer = array("b")
+
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+    def __len__(self):
+        return len(self.product_id)
+
+
+    def __iter__(self):
+        return self.records()
+
+
+    def __eq__(self, other):
+        if not isinstance(other, ProductBuffer):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+
+    def __repr__(self):
+        return f"ProductBuffer({self.date}, {self.store!r}, {self.category!r}, {len(self)} products)"
+
+
+    def append(self, product_id, product_name, has_bio_label, listed_price, listed_amount, listed_unit, is_on_offer):
+        """
+        adds a single product to the buffer.
+        """
+
+        self.product_id.append(product_id)
+        self.product_name.append(product_name)
+        self.has_bio_label.append(has_bio_label)
+        self.listed_price.append(listed_price)
+        self.listed_amount.append(listed_amount)
+        self.listed_unit.append(listed_unit)
+        self.is_on_offer.append(is_on_offer)
+
+
+    def extend(self, other):
+        """
+        adds all products of another buffer of the same date, store and category to this buffer.
+        """
+
+        for column in self.__slots__[3:]:
+            getattr(self, column).extend(getattr(other, column))
+
+
+    @classmethod
+    def from_records(cls, date, store, category, records):
+        """
+        creates a buffer out of product dictionaries, e.g. the products saved in the page cache or the checkpoint journal.
+        Keys of the dimension columns are ignored, the given date, store and category are used instead.
+        """
+
+        buffer = cls(date, store, category)
+        for record in records:
+            buffer.append(record["product_id"], record["product_name"], record["has_bio_label"], record["listed_price"],
+                          record["listed_amount"], record["listed_unit"], record["is_on_offer"])
+        return buffer
+
+
+    @classmethod
+    def concat(cls, buffers, date, store, category):
+        """
+        combines several buffers of the same date, store and category (e.g. the pages of a category) into one buffer.
+        """
+
+        combined = cls(date, store, category)
+        for buffer in buffers:
+            combined.extend(buffer)
+        return combined
+
+
+    def relabel(self, store=None, category=None):
+        """
+        returns a buffer with a different store and/or category that shares the columns of this buffer,
+        e.g. to replace the store and category names by their IDs in the database. Nothing is copied.
+        """
+
+        relabeled = ProductBuffer(self.date, self.store if store is None else store, self.category if category is None else category)
+        for column in self.__slots__[3:]:
+            setattr(relabeled, column, getattr(self, column))
+        return relabeled
+
+
+    def records(self, dimensions=True):
+        """
+        yields every product as a dictionary structured after the DailyData ORM in the models.py script,
+        e.g. for the bulk inserts of SQLAlchemy.
+
+        Args:
+        dimensions: leaves out the date, store and category if False.
+        """
+
+        for product_id, name, bio, price, amount, unit, offer in zip(self.product_id, self.product_name, self.has_bio_label,
+                                                                     self.listed_price, self.listed_amount, self.listed_unit, self.is_on_offer):
+            if dimensions:
+                yield {"date": self.date, "store_id": self.store, "product_id": product_id, "product_name": name, "has_bio_label": bool(bio),
+                       "category_id": self.category, "listed_price": price, "listed_amount": amount, "listed_unit": unit, "is_on_offer": bool(offer)}
+            else:
+                yield {"product_id": product_id, "product_name": name, "has_bio_label": bool(bio), "listed_price": price,
+                       "listed_amount": amount, "listed_unit": unit, "is_on_offer": bool(offer)}
+
+
+    def to_dataframe(self):
+        """
+        creates a pandas dataframe with the same columns and data types as a dataframe created from a list of product dictionaries.
+        The typed columns are handed over to pandas as NumPy views of their buffers, so the buffer 
+        can't be extended anymore while the dataframe exists.
+        """
+
+        length = len(self)
+        if not length:
+            return pd.DataFrame(columns=list(COLUMNS))
+
+        columns = {
+            "date": np.full(length, self.date, dtype=object),
+            "store_id": np.full(length, self.store, dtype=object),
+            "product_id": pd.Series(self.product_id).to_numpy(),
+            "product_name": np.array(self.product_name, dtype=object),
+            "has_bio_label": np.frombuffer(self.has_bio_label, dtype=np.int8).view(np.bool_),
+            "category_id": np.full(length, self.category, dtype=object),
+            "listed_price": np.frombuffer(self.listed_price, dtype=np.float64),
+            "listed_amount": np.frombuffer(self.listed_amount, dtype=np.float64),
+            "listed_unit": np.array(self.listed_unit, dtype=object),
+            "is_on_offer": np.frombuffer(self.is_on_offer, dtype=np.int8).view(np.bool_),
+        }
+        return pd.DataFrame(columns, columns=COLUMNS, copy=False)
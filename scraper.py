@@ -5,35 +5,136 @@ import re
 import signal
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
 
-import cloudscraper
 import pandas as pd
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
 from requests.exceptions import SSLError, RequestException
-from sqlalchemy.exc import IntegrityError
 
-import db_utils
-from models import Categories, Stores, DailyData
-from config import LOG_LEVEL, LOCATIONS, WEBSITES
+from extractors import get_extractor
+from checkpoints import CheckpointJournal
+from http_utils import (CircuitBreaker, RateLimiterManager, RetryPolicy, get_rate_limiter, is_challenge, parse_retry_after,
+                        save_learned_rates, use_shared_rate_limiters)
+from archive import HtmlArchive, can_revisit
+from page_cache import PageCache, content_hash
+from parquet_export import ParquetExport
+from session_pool import get_session_pool
+from product_buffer import ProductBuffer
+from sink import DailyDataSink
+from dimensions import get_category_keys, get_store_keys
+from writer import close_writer, connect_writer, get_writer, start_writer
+from database_engine import engine
+from models import DailyData
+from config import (
+    LOG_LEVEL, 
+    LOCATIONS, 
+    WEBSITES, 
+    MAX_CONCURRENT_REQUESTS, 
+    RETRY_STATUS_CODES,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_JITTER,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_COOLDOWN,
+    CIRCUIT_BREAKER_MAX_TRIPS,
+    PAGINATION_HISTORY_PATH, 
+    SPECULATIVE_PAGINATION, 
+    PARALLEL_STORES, 
+    MAX_STORE_PROCESSES,
+    PARSER_PROCESSES,
+    PARSE_QUEUE_SIZE,
+    EXTRACTOR,
+    PAGE_CACHE,
+    PAGE_CACHE_FILE,
+    CHECKPOINTS,
+    CHECKPOINT_FILE,
+    STREAMING_SINK,
+    SINK_BATCH_SIZE,
+    ARCHIVE,
+    ARCHIVE_PATH,
+    PARQUET_EXPORT,
+    PARQUET_PATH,
+    PARQUET_ROW_GROUP_SIZE,
+    WRITER_QUEUE_SIZE,
+    WRITER_TRANSACTION_ROWS
+)
 
 
 def main():
     application = Application()
     signal.signal(signal.SIGTERM, application.shutdown)
     signal.signal(signal.SIGINT, application.shutdown)
-    for scraper in application.scrapers:
-        scraper.scrape()
+    for scraper in application.run_scrapers():
         # scraper.save_as_csv_by_category() # uncomment this line for CSV creation
         # scraper.save_as_single_csv() # uncomment this line for CSV creation
         scraper.write_to_database()
-    application.stop_program()
+    application.stop_program(success=not application.failed_stores)
 
 
+def init_store_worker(batches, rate_limiters):
+    """
+    runs once at the start of every worker process of the parallel mode. 
+    Interrupts are handled by the main process, which terminates the worker processes (see Application.stop_store_processes).
+    The worker process hands its batches over to the writer of the main process (see writer.py) and draws its
+    requests from the rate limiters of the manager process, so all stores together keep to REQUESTS_PER_SECOND.
+    """
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    engine.dispose(close=False) # the worker process must not reuse the database connections inherited from the main process
+    connect_writer(batches)
+    use_shared_rate_limiters(rate_limiters)
+
+
+def scrape_store(location, location_cookie):
+    """
+    scrapes a single store inside a worker process of the parallel mode.
+    The worker process creates its own Application and Scraper and therefore its own session, 
+    cookies, token bucket and logger, isolated from the scrapers of the other stores.
+
+    Args:
+    location: the address of the store location as listed in the LOCATIONS variable of the config file.
+    location_cookie: the "_rdfa" cookie of the store location.
+
+    Output:
+    a tuple of the amount of http calls made, the amount of products found, the stage statistics, 
+    the session pool counters of this store and the all_products dictionary of the scraper.
+    """
+
+    application = Application(store_locations={location: location_cookie})
+    scraper = application.scrapers[0]
+    before = get_session_pool().stats() # the worker process and its session pool may be reused for several stores
+    scraper.scrape()
+    session_stats = {key: value - before[key] for key, value in get_session_pool().stats().items()}
+    return application.http_calls, application.total_items, application.stage_stats, session_stats, scraper.all_products
+
+
+def parse_page(html, date, store, category, page):
+    """
+    parses a single page of the REWE website inside one of the parser processes of a Scraper, 
+    using the extractor set with the EXTRACTOR variable in the config file.
+
+    Args:
+    html: the raw HTML of the page as received by the fetch stage.
+    date: the date of the scrape, used for the "date" column of every product.
+    store: the store location, used for the "store_id" column of every product.
+    category: the name of the category, used for the "category_id" column of every product.
+    page: the number of the page. The pagination is only checked on the first page.
+
+    Output:
+    a tuple of the category, the page, a ProductBuffer with the products found on the page, the last page 
+    found in the pagination (None if it isn't the first page) and the CPU time spent on parsing the page.
+    """
+
+    start = time.process_time()
+    products, last_page = get_extractor(EXTRACTOR).extract(html, date, store, category, page)
+    return category, page, products, last_page, time.process_time() - start
+
 
 class Application:
     """
@@ -41,16 +142,25 @@ class Application:
     creates the folders for the csv files to be stored.
     creates the environment needed for the Scraper class to work.
     creates the instances of the Scraper classes that scrape the webiste they are assigned to.
+
+    Args:
+    store_locations: dictionary of store locations and their cookies. Defaults to the LOCATIONS variable in the config file.
     """
     
-    def __init__(self):
+    def __init__(self, store_locations=LOCATIONS):
         self.startprocess = time.process_time()
         self.start = time.time()
         self.http_calls = 0 ## variable for the Scraper class to track the amount of http requests sent, which will be documented in the logs file
         self.total_items = 0 ## variable for the Scraper class to track the amount of products scraped, which will be documented in the logs file
+        self.stage_stats = {"fetch": StageStats(), "parse": StageStats()} ## throughput of both stages of the scraping pipeline, which will be documented in the logs file
+        self.counter_lock = threading.Lock() ## the counters above get updated by multiple worker threads at the same time
         self.today = datetime.now().date()
         self.setup_logger()
-        self.store_locations = LOCATIONS
+        self.store_locations = store_locations
+        self.failed_stores = [] ## stores whose scraper gave up after too many failed requests
+        self.writer = None ## the single writer of all scrapers, started once the scrapers run
+        self.store_processes = None ## the worker processes of the parallel mode while they are running
+        self.unfinished_stores = {} ## the futures of the stores the worker processes haven't finished yet
         self.scrapers = self.setup_scrapers()
         
 
@@ -120,20 +230,147 @@ class Application:
         return scrapers
 
 
+    def run_scrapers(self):
+        """
+        scrapes the stores of all scrapers and yields every scraper as soon as its products are ready.
+        If PARALLEL_STORES is enabled, the stores are scraped at the same time in separate worker processes.
+        If a scraper gives up, its store is skipped and added to self.failed_stores while the other stores continue.
+        """
+
+        if PARALLEL_STORES and len(self.scrapers) > 1:
+            yield from self.run_scrapers_in_processes()
+        else:
+            self.writer = start_writer(self.logger)
+            for scraper in self.scrapers:
+                try:
+                    scraper.scrape()
+                except ScrapingAborted as e:
+                    self.logger.critical(f"{e}. Skipping store.")
+                    self.failed_stores.append(scraper.location)
+                    continue
+                yield scraper
+
+
+    def run_scrapers_in_processes(self):
+        """
+        scrapes every store in its own worker process with its own session, so the total runtime 
+        depends on the largest store instead of the sum of all stores. The counters and products of 
+        the worker processes are merged back into this application and its scrapers.
+        """
+
+        max_workers = MAX_STORE_PROCESSES or len(self.scrapers)
+        self.logger.info("scraping %s stores in %s worker processes", len(self.scrapers), max_workers)
+
+        ## the writer runs in this process, the worker processes reach its queue and the shared rate limiters through a manager process
+        manager = RateLimiterManager()
+        manager.start(signal.signal, (signal.SIGINT, signal.SIG_IGN))
+        batches = manager.Queue(WRITER_QUEUE_SIZE)
+        rate_limiters = manager.RateLimiterRegistry()
+        self.writer = start_writer(self.logger, batches)
+        try:
+            self.store_processes = ProcessPoolExecutor(max_workers=max_workers, initializer=init_store_worker, initargs=(batches, rate_limiters))
+            futures = {self.store_processes.submit(scrape_store, scraper.location, scraper.location_cookie): scraper for scraper in self.scrapers}
+            self.unfinished_stores = dict(futures)
+            for future in as_completed(futures):
+                scraper = self.unfinished_stores.pop(future)
+                try:
+                    http_calls, total_items, stage_stats, session_stats, all_products = future.result()
+                except ScrapingAborted as e:
+                    self.logger.critical(f"{e}. Skipping store.")
+                    self.failed_stores.append(scraper.location)
+                    continue
+            
+                self.update_counters(http_calls=http_calls, total_items=total_items)
+                for stage, stats in stage_stats.items():
+                    self.record_stage(stage, **vars(stats))
+                get_session_pool().merge(session_stats)
+                scraper.all_products = all_products
+                self.logger.info("finished scraping store %s.", scraper.location)
+                yield scraper
+            self.store_processes.shutdown()
+            self.store_processes = None
+        except BaseException:
+            self.stop_store_processes()
+            raise
+        finally:
+            close_writer()
+            save_learned_rates(rate_limiters.rates()) # the worker processes leave the learned rates to this process
+            manager.shutdown()
+
+
+    def stop_store_processes(self):
+        """
+        terminates the worker processes of the parallel mode, e.g. after an interrupt, and adds the stores they haven't 
+        finished to self.failed_stores. The writer keeps writing the batches handed over until the worker processes have exited,
+        so a worker process never waits for room in the queue of a writer that was already closed.
+        """
+
+        executor, self.store_processes = self.store_processes, None
+        if executor is None:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        processes = list((executor._processes or {}).values()) # the executor can't terminate its worker processes itself
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        for scraper in self.unfinished_stores.values():
+            self.logger.critical(f"scraping of {scraper.location} was interrupted.")
+            self.failed_stores.append(scraper.location)
+        self.unfinished_stores = {}
+
+
+    def update_counters(self, http_calls=0, total_items=0):
+        """
+        thread-safe way for the Scraper class to add to the amount of http calls made and products found.
+        """
+
+        with self.counter_lock:
+            self.http_calls += http_calls
+            self.total_items += total_items
+
+
+    def record_stage(self, stage, **stats):
+        """
+        thread-safe way for the Scraper class to add to the throughput statistics of a stage of the scraping pipeline.
+
+        Args:
+        stage: either "fetch" or "parse".
+        stats: keyword arguments passed on to StageStats.add.
+        """
+
+        with self.counter_lock:
+            self.stage_stats[stage].add(**stats)
+
+
     def stop_program(self, success=True):
         """
-        logs the amount of http calls made, the total amount of items found, the total runtime, and total CPU runtime. 
+        logs the amount of http calls made, the total amount of items found, the throughput of the fetch and parse stages, 
+        the total runtime, and total CPU runtime. 
+        Stops the worker processes of the parallel mode first, if they are still running.
         Exits the program.
         """
 
         self.end = time.time()
         self.endprocess = time.process_time()
+        self.stop_store_processes()
+        failed_stores = "; ".join(self.failed_stores) or "none"
+        try:
+            close_writer() # writes the batches that are still queued
+        except Exception as e:
+            self.logger.error(f"an error ocurred while writing to the database: {e}")
+            success = False
+        writer_summary = self.writer.stats.summary() if self.writer else "not started"
         if success:
             self.logger.info(f"""
                 \nFINISHED SCRAPING.
                 \nCHECK VOLUME FOR SCRAPED DATA.
                 \nTOTAL CALLS MADE: {self.http_calls}
                 \nTOTAL ITEMS FOUND: {self.total_items}
+                \nFETCH STAGE: {self.stage_stats["fetch"].summary(self.end - self.start)}
+                \nPARSE STAGE: {self.stage_stats["parse"].summary(self.end - self.start)}
+                \nSESSIONS: {get_session_pool().summary()}
+                \nWRITER: {writer_summary}
                 \nTOTAL RUNTIME: {int((self.end - self.start) // 60)} minutes and {int((self.end - self.start) % 60)} seconds (precice: {round(self.end - self.start, 4)} seconds)
                 \nTOTAL CPU RUNTIME: {round(self.endprocess - self.startprocess, 2)} seconds
                 """)
@@ -141,8 +378,13 @@ class Application:
             self.logger.error(f"""
                 \nSCRAPING UNSUCCESSFUL.
                 \nCHECK LOGS FOR ERROR CODES.
+                \nFAILED STORES: {failed_stores}
                 \nTOTAL CALLS MADE: {self.http_calls}
                 \nTOTAL ITEMS FOUND: {self.total_items}
+                \nFETCH STAGE: {self.stage_stats["fetch"].summary(self.end - self.start)}
+                \nPARSE STAGE: {self.stage_stats["parse"].summary(self.end - self.start)}
+                \nSESSIONS: {get_session_pool().summary()}
+                \nWRITER: {writer_summary}
                 \nTOTAL RUNTIME: {int((self.end - self.start) // 60)} minutes and {int((self.end - self.start) % 60)} seconds (precice: {round(self.end - self.start, 4)} seconds)
                 \nTOTAL CPU RUNTIME: {round(self.endprocess - self.startprocess, 2)} seconds
                 """)
@@ -154,6 +396,50 @@ class Application:
         self.stop_program(success=False)
 
 
+class StageStats:
+    """
+    tracks the throughput of a single stage of the scraping pipeline (fetching or parsing), 
+    which will be documented in the logs file.
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.reused_pages = 0 # pages whose products were taken from the page cache instead of being parsed
+        self.products = 0
+        self.content_bytes = 0
+        self.busy_seconds = 0.0 # time spent on requesting or parsing pages, summed up over all threads or processes of the stage
+        self.blocked_seconds = 0.0 # time spent waiting for the next stage to catch up
+
+
+    def add(self, pages=0, reused_pages=0, products=0, content_bytes=0, busy_seconds=0.0, blocked_seconds=0.0):
+        self.pages += pages
+        self.reused_pages += reused_pages
+        self.products += products
+        self.content_bytes += content_bytes
+        self.busy_seconds += busy_seconds
+        self.blocked_seconds += blocked_seconds
+
+
+    def summary(self, runtime):
+        """
+        creates a single line of text describing the throughput of the stage over the given runtime in seconds.
+        """
+
+        runtime = max(runtime, 1e-9)
+        reused = f", {self.reused_pages} reused from the page cache" if self.reused_pages else ""
+        return (f"{self.pages} pages ({round(self.pages / runtime, 2)} pages/s{reused}), "
+                f"{self.products} products ({round(self.products / runtime, 1)} products/s), "
+                f"{round(self.content_bytes / 1_000_000, 1)} MB, "
+                f"busy for {round(self.busy_seconds, 1)} seconds, "
+                f"blocked for {round(self.blocked_seconds, 1)} seconds")
+
+
+class ScrapingAborted(Exception):
+    """
+    raised inside the worker threads of a Scraper once it stops sending requests.
+    """
+
+
 class Scraper:
     """
     scrapes all websites it gets assigned and saves the result as a csv files and/or as a database entry.
@@ -176,234 +462,448 @@ class Scraper:
         self.websites = websites
         self.location = location
         self.location_cookie = location_cookie
-        self.session = self.setup_request_session()
+        self.session = None # gets checked out of the session pool at the start of every scrape
         self.products_per_page = 250 # the maximum amount of objects that can be shown on a single webpage on the REWE website is 250
         self.all_products = {} # placeholder for the dictionary holding the dataframe structures that will in turn hold all scraped products. Will be used for saving as CSV files or writing to a relational database
-        self.failed_attempts = 0
+        self.retry_policy = RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_JITTER)
+        self.circuit_breaker = CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN) # pauses only the requests of this store
+        self.store_slug = re.sub(r"\W+", "_", location).strip("_").lower() # file system friendly name of the store location
+        self.pagination_history_file = os.path.join(PAGINATION_HISTORY_PATH, f"{self.store_slug}.json")
+        self.stop_event = threading.Event() # gets set once the scraper gives up, which stops all of its worker threads
+        self.parse_slots = threading.BoundedSemaphore(PARSE_QUEUE_SIZE) # limits the amount of pages that are fetched but not yet parsed
+        self.page_cache = None # gets opened at the start of every scrape if PAGE_CACHE is enabled
+        self.checkpoints = None # gets opened at the start of every scrape if CHECKPOINTS is enabled
+        self.sink = None # gets opened at the start of every scrape if STREAMING_SINK is enabled
+        self.archive = None # gets opened at the start of every scrape if ARCHIVE is enabled
+        self.export = None # gets opened at the start of every scrape if PARQUET_EXPORT is enabled
 
 
     def setup_request_session(self):
         """
-        creates a session with headers (that lower chance of bot detection) and 
-        cookies (that informs the REWE website which store's products to show) for the HTTP requests.
+        checks out a session from the session pool of this process, with headers (that lower chance of bot detection), 
+        the Cloudflare cookies of the pool and cookies (that informs the REWE website which store's products to show) for the HTTP requests.
         """
 
-        ua = UserAgent()
-        headers = {
-                "User-Agent": ua.random,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "Accept-Language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
-                "Referer": "https://shop.rewe.de/",
-                "Connection": "keep-alive",
-                "Cache-Control": "max-age=0"
-            }
-        
-        cookies = {
-            "_rdfa": self.location_cookie,
-            }
-        
-        session = cloudscraper.CloudScraper()
-        session.headers.update(headers)
-        session.cookies.update(cookies)
+        start = time.monotonic()
+        session = get_session_pool().checkout(self.location_cookie)
+        self.parent.logger.debug("session for %s ready after %s seconds", self.location, round(time.monotonic() - start, 3))
         return session
 
 
-    def check_pagination(self, soup):
+    def fetch_page(self, url, headers=None):
         """
-        checks for pagination in the BeautifulSoup object and updates the self.last_page variable accordingly
-        
-        args:
-        soup: BeautifulSoup Class
-        
-        output:
-        either the last page of the website or 1 (meaning there is only one page)
+        sends a GET request for the given URL as soon as the rate limiter of the host and the circuit breaker of the store allow it.
+        Every response is reported back to the rate limiter, which adapts the request rate of the host to its status code and response time.
+        Failed requests are retried with exponential backoff and jitter: responses with a status code listed in RETRY_STATUS_CODES 
+        are retried after the time given in their Retry-After header if there is one, and TLS errors additionally reset the 
+        connections of the session. Cloudflare challenge pages are retried like failed requests. Consecutive failures open the circuit breaker of this scraper, which pauses the requests 
+        of this store without affecting the other stores.
+
+        Args:
+        url: the URL of the page to be requested.
+        headers: additional headers for this request only, e.g. for conditional requests.
+
+        Output:
+        the response object of the successful request.
         """
 
-        lastpage = soup.find_all("button", class_="PostRequestGetFormButton paginationPage paginationPageLink")
-        if lastpage:
-            last_page = int(lastpage[-1].get_text(strip=True))
-            return last_page
-        else:
-            return 1
+        attempt = 0
+        while True:
+            self.circuit_breaker.wait(self.stop_event)
+            if self.stop_event.is_set():
+                raise ScrapingAborted(f"scraping of {self.location} was stopped before {url} could be requested")
+            
+            rate_limiter = get_rate_limiter(url) # the rate limiter is shared with all other scrapers requesting the same host
+            sent_at = rate_limiter.acquire()
+            retry_after = None
+            try:
+                response = self.session.get(url, headers=headers)
+                self.parent.logger.debug(f"status code: {response.status_code}")
+                self.parent.update_counters(http_calls=1)
+                challenge = is_challenge(response)
+                rate_limiter.record_response(sent_at, response.status_code, challenge)
+                if response.status_code not in RETRY_STATUS_CODES and not challenge:
+                    self.circuit_breaker.record_success()
+                    get_session_pool().observe(self.session) # shares newly received Cloudflare cookies with the other sessions
+                    return response
+                
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if challenge:
+                    self.parent.logger.error(f"Cloudflare challenge for {url}, request rate lowered to {round(rate_limiter.rate, 2)} requests per second.")
+                else:
+                    self.parent.logger.error(f"status code {response.status_code} for {url}.")
+
+            except SSLError as e:
+                self.parent.logger.error(f"SSL error: {e}.")
+                rate_limiter.record_failure(sent_at)
+                self.session.get_adapter(url).poolmanager.clear() # drops the connections of this session only, so the retry starts with a new TLS handshake
 
+            except RequestException as e:
+                self.parent.logger.error(f"Request failed: {e}.")
+                rate_limiter.record_failure(sent_at)
 
-    def parse_amount(self, amount):
+            attempt += 1
+            self.register_failed_attempt(url, attempt, retry_after)
+
+
+    def register_failed_attempt(self, url, attempt, retry_after=None):
         """
-        takes the amount scraped from the website and parses it for mentions of any typically 
-        found standard units like gramm or liter and extracts the listed amount and unit accordingly.
+        counts a failed request in the circuit breaker of this scraper and waits before the request gets retried.
+        Gives up on this store if the page has failed too often or the circuit breaker keeps opening without any successful request.
 
         Args:
-        amount: a string derived from the BeautifulSoup item that mentions the amount of a product.
+        url: the URL of the failed request.
+        attempt: the amount of failed attempts of this page so far.
+        retry_after: the seconds requested by the server in the Retry-After header of the response, if there was one.
+        """
+
+        if self.circuit_breaker.record_failure():
+            self.parent.logger.critical(f"too many failed requests for {self.location}, pausing its requests for {self.circuit_breaker.cooldown} seconds.")
+        
+        if attempt >= self.retry_policy.max_attempts or self.circuit_breaker.trips >= CIRCUIT_BREAKER_MAX_TRIPS:
+            self.stop_event.set()
+            raise ScrapingAborted(f"maximum attempts reached while scraping {self.location}")
+        
+        delay = self.retry_policy.delay(attempt, retry_after)
+        self.parent.logger.info(f"will retry {url} in {round(delay, 1)} seconds (attempt {attempt + 1} of {self.retry_policy.max_attempts})")
+        self.stop_event.wait(delay)
+
+
+    def fetch_html(self, website, category, page):
+        """
+        requests a single page of a category and hands its raw HTML over to the parse stage. 
+        Runs inside one of the fetch threads of the scrape method. 
+        Waits for a free slot in the parse queue before sending the request, so the fetch threads 
+        pause whenever the parser processes fall behind and the amount of raw HTML held in memory stays bounded.
+
+        Args:
+        website: the URL of the category as listed in the config file.
+        category: the name of the category.
+        page: the number of the page to be requested.
+
+        If the page cache is enabled, a conditional request is sent for pages that have been cached before. 
+        If the server answers with 304 "Not Modified" or the content hash of the page is unchanged, 
+        the products extracted during a previous run are loaded from the cache instead of parsing the page again.
+        If ARCHIVE is enabled, the raw HTML of every page is queued for the archive of the run (see archive.py),
+        pages that weren't modified are archived as a reference to their earlier response.
 
         Output:
-        listed_amount: a float that only lists the amount of the product.
-        listed_unit: a string that only lists the unit of the product.
+        a dictionary with the raw HTML of the page, its content hash, the ETag and Last-Modified headers of the response 
+        and, if the page is unchanged, the cached products and last page.
         """
 
-        amount_cleaned = re.sub(r"""[\"']|\(.*?\)""", "", amount).strip()
-        amount_cleaned = re.sub(r"\s+", "", amount_cleaned)
-        listed_amount = None
-        listed_unit = None
-        units = ["g", "ml", "kg", "l"]
-        
-        for unit in units:
-            try:
-                search_unit = re.search(rf"(\d+)(?={unit})", amount_cleaned)
-                if search_unit:
-                    if "," in amount_cleaned:
-                        listed_amount = re.search(r"\d+(\,\d+)?", amount_cleaned)
-                        listed_amount = float(listed_amount.group().replace(",", "."))
-                    else:
-                        listed_amount = float(search_unit.group(1))
-                    listed_unit = unit
-            except:
-                pass
-
-        if not listed_amount:
-            listed_amount = 1.0
-            listed_unit = "piece"
+        blocked_start = time.monotonic()
+        while not self.parse_slots.acquire(timeout=0.1):
+            if self.stop_event.is_set():
+                raise ScrapingAborted(f"scraping of {self.location} was stopped before page {page} of {category} could be requested")
+        blocked_seconds = time.monotonic() - blocked_start
+
+        try:
+            fetch_start = time.monotonic()
+            cached = self.page_cache.lookup(self.location, category, page) if self.page_cache else None
+            url_page = f"{website}/?objectsPerPage={self.products_per_page}&page={page}" 
+            
+            ## without a recent enough archived response, a 304 couldn't be archived as a reference, so the page is requested in full
+            conditional = cached and (not self.archive or can_revisit(cached.archived, self.parent.today))
+            response = self.fetch_page(url_page, headers=cached.conditional_headers() if conditional else None)
+            products = None
+            if response.status_code == 304 and cached:
+                products = self.page_cache.load_products(cached.digest, self.parent.today, self.location, category)
+                if products is None:
+                    ## a 304 response has no content to parse, so the page is requested again without conditional headers
+                    self.parent.logger.info("cached products of page %s of %s are missing, requesting the page again", page, category)
+                    response = self.fetch_page(url_page)
+            
+            fetched = {
+                "html": response.text, 
+                "digest": None, 
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "products": None, 
+                "last_page": None
+            }
+            if self.page_cache:
+                if response.status_code == 304 and cached:
+                    fetched.update(digest=cached.digest, etag=cached.etag, last_modified=cached.last_modified, products=products)
+                else:
+                    fetched["digest"] = content_hash(fetched["html"], EXTRACTOR)
+                
+                    ## reuses the products of the previous run if the content of the page is unchanged
+                    if cached and fetched["digest"] == cached.digest:
+                        fetched["products"] = self.page_cache.load_products(cached.digest, self.parent.today, self.location, category)
+                if fetched["products"] is not None:
+                    fetched["last_page"] = cached.last_page
             
+            ## written by the background thread of the archive. Pages that weren't modified refer to their earlier response
+            if self.archive:
+                if response.status_code == 304 and cached:
+                    self.archive.add_revisit(url_page, self.location, category, page, cached.digest)
+                else:
+                    self.archive.add(url_page, self.location, category, page, response.content, fetched["digest"])
+                    if cached:
+                        self.page_cache.mark_archived(self.location, category, page, self.parent.today)
+        
+        except BaseException:
+            self.parse_slots.release()
+            raise
+        
+        self.parent.record_stage("fetch", pages=1, content_bytes=len(response.content), reused_pages=int(fetched["products"] is not None),
+                                 busy_seconds=time.monotonic() - fetch_start, blocked_seconds=blocked_seconds)
+        self.parent.logger.info("successfully reached page %s of %s", page, category)
+        return fetched
+
+
+    def load_pagination_history(self):
+        """
+        loads the last page of every category that was found during the previous run for this store.
+
+        Output:
+        a dictionary with the category names as keys and their last page as values.
+        """
+
         try:
-            multiplier = re.search(r"\d+(?=x)", amount_cleaned).group()
-            if multiplier:
-                listed_amount = float(multiplier) * float(listed_amount)
-        except:
-            pass
+            with open(self.pagination_history_file) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
 
-        return listed_amount, listed_unit
+
+    def save_pagination_history(self, history):
+        """
+        saves the last page of every category for the speculative requests of the next run.
+
+        Args:
+        history: a dictionary with the category names as keys and their last page as values.
+        """
+
+        os.makedirs(os.path.dirname(self.pagination_history_file), exist_ok=True)
+        with open(self.pagination_history_file, "w") as file:
+            json.dump(history, file, indent=4)
 
 
     def scrape(self):
         """
-        scrapes the products of every website listed in the config file
+        scrapes the products of every website listed in the config file.
+        Fetching and parsing run as two separate stages: a pool of fetch threads requests the pages 
+        while the token bucket shared by all scrapers keeps the request rate below the rate limit of the REWE website, 
+        and a pool of parser processes turns the raw HTML into products. The parse queue between both stages 
+        is bounded by PARSE_QUEUE_SIZE.
+        
+        The first page of every category is queued first. As soon as it reveals the last page of the category, 
+        all remaining pages are queued at once. If SPECULATIVE_PAGINATION is enabled, the pages up to the last page 
+        found during the previous run are queued right away and results for pages that no longer exist are discarded.
+        Pages that are unchanged since the previous run are taken from the page cache instead of being parsed (see fetch_html).
+        If CHECKPOINTS is enabled, every finished page is recorded in the checkpoint journal and a restarted run
+        only requests the pages that are still missing. If STREAMING_SINK is enabled, every finished page is 
+        written to the database by the streaming sink and only its amount of products is kept in memory.
 
         output:
         a dictionary of pandas dataframes structured after the DailyData ORM in the models.py script
         """
 
-        for website in self.websites:
-            page = 1 # current page, gets updated at the end of every successfully scraped page
-            last_page = 1 # during the scrape method, this will get updated to the actual last page if there is more than one page
-            category = re.sub(r"^https?://shop.rewe.de/c/", "", website)
-            products = []
-            self.parent.logger.info("""starting to scrape %s""", website)
-        
-            while page <= last_page: 
-                url_page = f"{website}/?objectsPerPage={self.products_per_page}&page={page}" 
-                
+        self.session = self.setup_request_session()
+        history = self.load_pagination_history()
+        categories = {} # holds the website, the last page and the products of every scraped page for each category
+        pending = {} # maps the futures of both stages to the stage, category and page they are working on
+        page_cache_entries = {} # holds the content hash and response headers of every parsed page until it is certain that the page exists
+        self.page_cache = PageCache(PAGE_CACHE_FILE) if PAGE_CACHE else None
+        self.checkpoints = CheckpointJournal(CHECKPOINT_FILE, self.parent.today) if CHECKPOINTS else None
+        self.sink = DailyDataSink(self.parent.logger, SINK_BATCH_SIZE, self.websites) if STREAMING_SINK else None
+        self.archive = HtmlArchive(ARCHIVE_PATH, self.parent.today, self.store_slug, self.parent.logger) if ARCHIVE else None
+        self.export = ParquetExport(PARQUET_PATH, self.parent.today, self.location, self.parent.logger, PARQUET_ROW_GROUP_SIZE) if PARQUET_EXPORT else None
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as fetchers, ProcessPoolExecutor(max_workers=PARSER_PROCESSES) as parsers:
+            def queue_page(category, page):
+                state = categories[category]
+                state["queued"].add(page)
+                future = fetchers.submit(self.fetch_html, state["website"], category, page)
+                pending[future] = ("fetch", category, page)
+
+            def queue_parsing(category, page, html):
                 try:
-                    response = self.session.get(url_page)
-                    self.parent.logger.debug(f"status code: {response.status_code}")
-                    self.parent.http_calls += 1
-                    self.parent.logger.info("successfully reached page %s", page)
-                    soup = BeautifulSoup(response.text, "lxml")
+                    future = parsers.submit(parse_page, html, self.parent.today, self.location, category, page)
+                except BaseException:
+                    self.parse_slots.release()
+                    raise
+                future.add_done_callback(lambda _: self.parse_slots.release())
+                pending[future] = ("parse", category, page)
+
+            def add_page(category, page, products, last_page):
+                state = categories[category]
+                state["pages"][page] = products
+
+                ## queues all remaining pages of the category as soon as the first page reveals the last page
+                if page == 1:
+                    state["last_page"] = last_page
+                    for next_page in range(2, last_page + 1):
+                        if next_page not in state["queued"]:
+                            queue_page(category, next_page)
                     
-                    ## for debugging: saves the recieved HTML as a file in a folder called "workbench" for reference
-                    if self.parent.logger.isEnabledFor(logging.DEBUG):
-                        os.makedirs("workbench", exist_ok=True)
-                        with open(f"workbench/soup_html_{self.parent.today}.html", "w") as file:
-                            file.write(soup.prettify())
-
-                    ## this will only run once unless a last page higher than 1 is found
-                    if page == 1:
-                        last_page = self.check_pagination(soup)
-
-                    matches = soup.find_all("section", class_="search-service-product product plrProductGrid__tile")
-                    for item in matches:
-                        self.parent.total_items += 1
-                        
-                        ## gets the unique product ID to be used as the primary key in the database entry for the product
-                        meso_data = item.find("meso-data")
-                        if meso_data:
-                            data_productid = meso_data.get("data-productid")
-                            if data_productid and data_productid.isdigit():  # ensures it's a valid integer string
-                                product_id = int(data_productid)
-                        if not product_id: # if "meso-data" didn't work, tries to find the "input" element and extract "value"
-                            input_element = item.find("input")
-                            if input_element:
-                                input_value = input_element.get("value")
-                                if input_value and input_value.isdigit():  # ensures it's a valid integer string
-                                    product_id = int(input_value) if product_id else None
-
-                        ## gets the name of the product and cleans the data point using regular expressions
-                        name = item.find("div", class_="LinesEllipsis")
-                        name = name.text if name else None
-                        name = re.sub(r"""[\"']""", "", name).strip() if name else None
-                        
-                        ## gets the price of the product and turns it into an integer
-                        ## checks if the product has a reduced price and assigns either True or False to the "reduced price" data point of the product
-                        listed_price = item.find("div", class_="search-service-productPrice productPrice") 
-                        if listed_price:
-                            is_on_offer = False
-                            listed_price = listed_price.text
-                            listed_price = float(listed_price.replace("€", "").replace(",",".").strip())
-                        else:
-                            is_on_offer = True
-                            listed_price = item.find("div", class_="search-service-productOfferPrice productOfferPrice")
-                            listed_price = listed_price.text
-                            listed_price = float(listed_price.replace("€", "").replace(",",".").strip())
-                        
-                        ## gets the listed amount of the product and its unit measurement
-                        listed_amount = item.find("div", class_="productGrammage search-service-productGrammage")
-                        listed_amount = listed_amount.text if listed_amount else "1 Stück"
-                        listed_amount, listed_unit = self.parse_amount(listed_amount)                        
-                        
-                        ## checks if the product has a bio-label and assigns either True or False to the "bio label" data point of the product
-                        biolabel = item.find("div", class_="organicBadge badgeItem search-service-organicBadge search-service-badgeItem")
-                        biolabel = True if biolabel else False
-
-                        ## appends all data points of the product to the self.products variable to construct a table of products
-                        products.append({"date": self.parent.today,
-                                         "store_id": self.location,
-                                         "product_id": product_id, 
-                                         "product_name": name, 
-                                         "has_bio_label": biolabel, 
-                                         "category_id": category, 
-                                         "listed_price": listed_price, 
-                                         "listed_amount": listed_amount, 
-                                         "listed_unit": listed_unit, 
-                                         "is_on_offer": is_on_offer, 
-                                         })
-                    
-                    self.parent.logger.info("successfully scraped page %s", page)
-                    page += 1
-                    time.sleep(1) # the rate limiting of the REWE website blocks HTTP requests after roughly 85 requests unless a 1 second buffer is included
+                    ## cancels or discards speculative pages that don't exist anymore
+                    for other_future, (_, other_category, other_page) in pending.items():
+                        if other_category == category and other_page > last_page:
+                            other_future.cancel()
+                    for surplus_page in [p for p in state["pages"] if p > last_page]:
+                        self.parent.logger.debug("discarding page %s of %s", surplus_page, category)
+                        del state["pages"][surplus_page]
+                        page_cache_entries.pop((category, surplus_page), None)
                 
-                except SSLError as e:
-                    self.parent.logger.critical(f"SSL error: {e}.")
-                    self.parent.logger.info(f"will retry in 10 seconds")
-                    self.failed_attempts += 1
-                    if self.failed_attempts > 5:
-                        self.parent.logger.critical(f"maximum attempts reached. Quitting program.")
-                        self.parent.stop_program(success=False)
-                    else:
-                        time.sleep(10)
-                        self.scrape()
+                elif state["last_page"] is not None and page > state["last_page"]:
+                    self.parent.logger.debug("discarding page %s of %s", page, category)
+                    del state["pages"][page]
+                    page_cache_entries.pop((category, page), None)
+
+                ## records every page in the page cache and the checkpoint journal and hands it over to the Parquet export and 
+                ## the streaming sink once it is certain that the page exists
+                if state["last_page"] is not None:
+                    for finished_page in sorted(set(state["pages"]) - state["recorded"]):
+                        if (category, finished_page) in page_cache_entries:
+                            digest, etag, last_modified = page_cache_entries.pop((category, finished_page))
+                            self.page_cache.store(self.location, category, finished_page, digest, etag, last_modified, 
+                                                  state["last_page"] if finished_page == 1 else None, state["pages"][finished_page],
+                                                  archived=self.parent.today if self.archive else None)
+                        if self.checkpoints:
+                            self.checkpoints.record(self.location, category, finished_page, 
+                                                    state["last_page"] if finished_page == 1 else None, state["pages"][finished_page])
+                        if self.export:
+                            self.export.add(state["pages"][finished_page])
+                        if self.sink:
+                            stream_page(state, finished_page)
+                        state["recorded"].add(finished_page)
+
+            def stream_page(state, page):
+                self.sink.add(state["pages"][page])
+                state["streamed"] += len(state["pages"][page])
+                state["pages"][page] = None # the products are in the sink, only the page number is kept
+
+            for website in self.websites:
+                category = re.sub(r"^https?://[^/]+/c/", "", website)
+                state = categories[category] = {"website": website, "last_page": None, "queued": set(), "recorded": set(), "pages": {}, "streamed": 0}
                 
-                except RequestException as e:
-                    self.parent.logger.critical(f"Request failed: {e}.")
-                    self.parent.logger.info(f"will retry in 10 seconds")
-                    self.failed_attempts += 1
-                    if self.failed_attempts > 5:
-                        self.parent.logger.critical(f"maximum attempts reached. Quitting program.")
-                        self.parent.stop_program(success=False)
-                    else:
-                        time.sleep(10)
-                        self.scrape()
+                ## restores the pages that were already scraped today before the run was interrupted
+                restored = self.checkpoints.load(self.location, category, self.parent.today) if self.checkpoints else {}
+                if 1 in restored:
+                    state["last_page"] = restored[1][1]
+                    for page, (products, _) in restored.items():
+                        if page <= state["last_page"]:
+                            state["pages"][page] = products
+                            state["queued"].add(page)
+                            state["recorded"].add(page)
+                            if self.export:
+                                self.export.add(products)
+                            if self.sink:
+                                stream_page(state, page) # the products may not have been flushed before the run was interrupted
+                    self.parent.logger.info("""resuming %s from checkpoint, %s of %s pages already scraped""", 
+                                            website, len(state["pages"]), state["last_page"])
+                    for page in range(2, state["last_page"] + 1):
+                        if page not in state["queued"]:
+                            queue_page(category, page)
+                else:
+                    self.parent.logger.info("""starting to scrape %s""", website)
+                    queue_page(category, 1)
             
-            ## creates a Pandas dataframe out of all the gathered products and stores 
-            ## it in the list variable called "self.all_products"
-            df = pd.DataFrame(products)
-            df.fillna(0)
-            df.set_index("product_id")
-            df.drop_duplicates(subset="product_id", inplace=True)
-            self.all_products[category] = df
+            ## queues the pages that existed during the previous run before their first page is parsed
+            if SPECULATIVE_PAGINATION:
+                for category, state in categories.items():
+                    if state["last_page"] is None:
+                        for page in range(2, history.get(category, 1) + 1):
+                            queue_page(category, page)
+
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, category, page = pending.pop(future)
+                        if future.cancelled():
+                            page_cache_entries.pop((category, page), None)
+                            continue
+                        state = categories[category]
+                        
+                        ## hands the raw HTML over to the parser processes unless the page turned out not to exist 
+                        ## or its products could be loaded from the page cache
+                        if stage == "fetch":
+                            fetched = future.result()
+                            if state["last_page"] is not None and page > state["last_page"]:
+                                self.parent.logger.debug("discarding page %s of %s", page, category)
+                                self.parse_slots.release()
+                            elif fetched["products"] is not None:
+                                self.parse_slots.release()
+                                self.parent.logger.info("page %s of %s is unchanged, reusing cached products", page, category)
+                                add_page(category, page, fetched["products"], fetched["last_page"])
+                            else:
+                                if self.page_cache:
+                                    page_cache_entries[(category, page)] = (fetched["digest"], fetched["etag"], fetched["last_modified"])
+                                queue_parsing(category, page, fetched["html"])
+                            continue
+                        
+                        _, _, products, last_page, parse_seconds = future.result()
+                        self.parent.record_stage("parse", pages=1, products=len(products), busy_seconds=parse_seconds)
+                        if state["last_page"] is not None and page > state["last_page"]:
+                            self.parent.logger.debug("discarding page %s of %s", page, category)
+                            page_cache_entries.pop((category, page), None)
+                            continue
+                        self.parent.logger.info("successfully scraped page %s of %s", page, category)
+                        add_page(category, page, products, last_page)
             
-            page -= 1
-            self.parent.logger.info("finished scraping. last page: %s.", page)
+            except BaseException:
+                ## stops the fetch threads (including those waiting for a parse slot) and the parser processes on any error,
+                ## otherwise leaving the executors would wait for fetch threads that never get a slot
+                self.stop_event.set()
+                fetchers.shutdown(wait=True, cancel_futures=True)
+                parsers.shutdown(wait=True, cancel_futures=True)
+                
+                ## releases the slots of pages that were fetched but never handed over to the parser processes
+                for future, (stage, _, _) in pending.items():
+                    if stage == "fetch" and future.done() and not future.cancelled() and future.exception() is None:
+                        self.parse_slots.release()
+                page_cache_entries.clear() # the pages of parses that were cancelled are never stored
+                get_session_pool().checkin(self.session)
+                if self.page_cache:
+                    self.page_cache.close()
+                if self.checkpoints:
+                    self.checkpoints.close()
+                if self.sink:
+                    self.sink.close() # the pages scraped so far are kept in the database
+                if self.archive:
+                    self.archive.close()
+                if self.export:
+                    self.export.close(commit=False) # keeps the partitions of earlier runs instead of replacing them with an incomplete store
+                save_learned_rates()
+                raise
         
+        ## creates a Pandas dataframe out of all the gathered products of every category and 
+        ## stores it in the "self.all_products" variable in the order of the config file
+        ## (the products of the streaming sink are already in the database, so only their amount is counted)
+        for category, state in categories.items():
+            if self.sink:
+                self.parent.update_counters(total_items=state["streamed"])
+            else:
+                products = ProductBuffer.concat((state["pages"][page] for page in sorted(state["pages"])), 
+                                                self.parent.today, self.location, category)
+                self.parent.update_counters(total_items=len(products))
+                df = products.to_dataframe()
+                df.fillna(0)
+                df.set_index("product_id")
+                df.drop_duplicates(subset="product_id", inplace=True)
+                self.all_products[category] = df
+            history[category] = state["last_page"]
+            self.parent.logger.info("finished scraping %s. last page: %s.", category, state["last_page"])
+        
+        self.save_pagination_history(history)
+        save_learned_rates()
+        
+        if self.page_cache:
+            self.page_cache.close()
+        if self.checkpoints:
+            self.checkpoints.close()
+        if self.sink:
+            self.sink.close()
+        if self.archive:
+            self.archive.close()
+        if self.export:
+            self.export.close()
         if self.session:
-            self.session.close()
+            get_session_pool().checkin(self.session) # keeps the connections and Cloudflare cookies for the next scraper and run
 
 
     def save_as_csv_by_category(self):
@@ -417,8 +917,7 @@ class Scraper:
         
         for category, dataframe in self.all_products.items():
             filename = os.path.join(self.parent.today_data_path, f"{category}.csv")
-            dataframe.drop("category_ID", axis=1)
-            dataframe.to_csv(filename)
+            dataframe.drop(columns="category_id").to_csv(filename, index=False)
 
             self.parent.logger.info("""finished writing csv file %s""", filename)
 
@@ -433,53 +932,72 @@ class Scraper:
 
         dataframe = pd.concat(self.all_products.values())
         filename = os.path.join(self.parent.today_data_path, f"{self.parent.today}.csv")
-        dataframe.to_csv(filename)
+        dataframe.to_csv(filename, index=False)
         
         self.parent.logger.info("""finished writing csv file %s""", filename)
 
 
+    def clear_checkpoints(self):
+        """
+        removes the checkpoints of this store once its products are written to the database, 
+        so a second run on the same day scrapes the store again.
+        """
+
+        if CHECKPOINTS:
+            checkpoints = CheckpointJournal(CHECKPOINT_FILE, self.parent.today)
+            checkpoints.clear(self.location)
+            checkpoints.close()
+
+
     def write_to_database(self):
         """
         writes all products in the the self.all_products variable to the DailyData table in 
         the database. Cleans up the data before insertion to be in line with the database ORM schema.
+        If STREAMING_SINK is enabled, the products were already written during the scrape and only the statistics are created.
         """
 
+        writer = get_writer()
+        if STREAMING_SINK:
+            writer.flush()
+            self.clear_checkpoints()
+            self.create_statistics()
+            return
+
         self.parent.logger.info("preparing data for insertion into DailyData table in database...")
         dataframe = pd.concat(self.all_products.values())
         dataframe.drop_duplicates(subset="product_id", inplace=True)
-        data = dataframe.to_dict(orient="records")
 
-        with db_utils.session_query() as session:
-            ## changes the categories from its names to the corresponding category_id
-            category_query = session.query(Categories).all()
-            category_mapping = {category.category_name: category.category_id for category in category_query}
-            for product in data:
-                category = product["category_id"]
-                if category in category_mapping:
-                    product["category_id"] = category_mapping[category]
-
-            ## changes the stores from its names to the corresponding store_id
-            store_query = session.query(Stores).all()
-            store_mapping = {store.store_name: store.store_id for store in store_query}
-            for product in data:
-                store = product["store_id"]
-                if store in store_mapping:
-                    product["store_id"] = store_mapping[store]
+        ## changes the categories and stores from their names to the corresponding IDs, creating the ones that are new
+        dataframe["category_id"] = get_category_keys().map(dataframe["category_id"])
+        dataframe["store_id"] = get_store_keys().map(dataframe["store_id"])
+
+        data = dataframe.to_dict(orient="records")
 
         self.parent.logger.info("writing to DailyData table in database...")
         try:
-            with db_utils.session_commit() as session:
-                session.bulk_insert_mappings(DailyData, data)
-
-        except IntegrityError:
-            with db_utils.session_commit() as session:
-                db_utils.bulk_upsert(DailyData, data)
+            for offset in range(0, len(data), WRITER_TRANSACTION_ROWS):
+                writer.submit(DailyData, data[offset:offset + WRITER_TRANSACTION_ROWS])
+            writer.flush()
+            self.parent.logger.info(f"upserted {len(data)} rows into DailyData table")
+            self.clear_checkpoints()
 
         finally:
-            try:
-                subprocess.run([sys.executable, "data_handler.py"])
-            except Exception as e:
-                self.parent.logger.error(f"an error ocurred while creating statistical data: {e}")
+            self.create_statistics()
+
+
+    def create_statistics(self):
+        """
+        runs the data_handler.py script, which creates the statistical data of the products in the database.
+        The writer is paused in the meantime, so the script is the only one writing to the database.
+        """
+
+        try:
+            with get_writer().paused():
+                result = subprocess.run([sys.executable, "data_handler.py"])
+            if result.returncode != 0:
+                self.parent.logger.error(f"data_handler.py exited with code {result.returncode}, the statistical data may be incomplete.")
+        except Exception as e:
+            self.parent.logger.error(f"an error ocurred while creating statistical data: {e}")
 
 
 if __name__ == "__main__":
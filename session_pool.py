@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+import cloudscraper
+from fake_useragent import UserAgent
+from requests.cookies import create_cookie
+
+from config import SESSION_FILE, SESSION_MAX_AGE
+
+"""
+pool of the request sessions of all scrapers running in the same process.
+Cloudflare binds its clearance cookies to the User-Agent that solved the challenge, so the pool keeps a single identity
+(User-Agent and Cloudflare cookies) that every new session starts with, instead of picking a new User-Agent and solving
+the challenge again for every store. The identity is saved to disk and reused by the next run as long as it is younger
+than SESSION_MAX_AGE and its cookies haven't expired. Every session has its own connection pool, which is handed to the
+next session once the session is checked in, so keep-alive connections to the REWE website outlive the scrapers that opened
+them, while resetting the connections of a session (e.g. after a TLS error) never affects the other sessions.
+"""
+
+HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Referer": "https://shop.rewe.de/",
+    "Connection": "keep-alive",
+    "Cache-Control": "max-age=0"
+}
+
+CLEARANCE_COOKIE = "cf_clearance" # set by Cloudflare once a challenge is solved
+CLOUDFLARE_COOKIE_PREFIXES = ("cf_", "__cf", "_cf")
+
+
+@lru_cache(maxsize=1)
+def user_agents():
+    """
+    loads the User-Agent data of fake_useragent once per process, and only if a new identity is needed.
+    """
+
+    return UserAgent()
+
+
+def is_cloudflare_cookie(name):
+    return name.startswith(CLOUDFLARE_COOKIE_PREFIXES)
+
+
+class SessionPool:
+    """
+    hands out request sessions that share the User-Agent and the Cloudflare cookies of the process and reuse the connection pools of earlier sessions.
+
+    Args:
+    path: the location of the JSON file the identity is saved in between runs.
+    max_age: seconds after which an identity is replaced by a new one.
+    """
+
+    def __init__(self, path, max_age):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.adapters = [] # the connection pools of the sessions that were checked in, reused by the next sessions
+        self.solved = 0 # Cloudflare challenges solved, i.e. new clearance cookies received
+        self.reused = 0 # sessions that started with the clearance cookie of an earlier session or run
+        self.identity = self.load()
+
+
+    def load(self):
+        """
+        loads the identity saved by the previous run, or None if there is none or it isn't valid anymore.
+        """
+
+        try:
+            with open(self.path) as file:
+                identity = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return identity if self.is_valid(identity) else None
+
+
+    def is_valid(self, identity):
+        now = time.time()
+        if now - identity["created"] > self.max_age:
+            return False
+        return all(cookie["expires"] is None or cookie["expires"] > now for cookie in identity["cookies"])
+
+
+    def save(self):
+        """
+        saves the current identity, so the next run can reuse its User-Agent and Cloudflare cookies.
+        The file is replaced in a single step, so worker processes of the parallel mode saving at the same time 
+        (or an interrupted save) never leave a truncated file behind.
+        """
+
+        with self.lock:
+            if self.identity is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as file:
+                json.dump(self.identity, file, indent=4)
+            os.replace(temporary, self.path)
+
+
+    def checkout(self, location_cookie):
+        """
+        creates a session with headers (that lower chance of bot detection), the Cloudflare cookies of the pool and
+        the "_rdfa" cookie (that informs the REWE website which store's products to show) for the HTTP requests.
+
+        Args:
+        location_cookie: the "_rdfa" cookie of the store location.
+        """
+
+        with self.lock:
+            if self.identity is None or not self.is_valid(self.identity):
+                self.identity = {"user_agent": user_agents().random, "cookies": [], "created": time.time()}
+            identity = self.identity
+            if any(cookie["name"] == CLEARANCE_COOKIE for cookie in identity["cookies"]):
+                self.reused += 1
+
+        session = cloudscraper.CloudScraper()
+        session.headers.update({"User-Agent": identity["user_agent"], **HEADERS})
+        for cookie in identity["cookies"]:
+            session.cookies.set_cookie(create_cookie(**cookie))
+        session.cookies.update({"_rdfa": location_cookie})
+
+        with self.lock:
+            if self.adapters:
+                session.mount("https://", self.adapters.pop())
+        return session
+
+
+    def observe(self, session):
+        """
+        takes over new Cloudflare cookies that a session received, so every session created afterwards starts with them.
+        A new clearance cookie means that the session had to solve a challenge.
+        """
+
+        cookies = [{"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path, "expires": cookie.expires}
+                   for cookie in session.cookies if is_cloudflare_cookie(cookie.name)]
+        if not cookies:
+            return
+        with self.lock:
+            known = {(cookie["name"], cookie["value"]) for cookie in self.identity["cookies"]}
+            if all((cookie["name"], cookie["value"]) in known for cookie in cookies):
+                return
+            if any(cookie["name"] == CLEARANCE_COOKIE and (cookie["name"], cookie["value"]) not in known for cookie in cookies):
+                self.solved += 1
+                self.identity["created"] = time.time()
+            self.identity["cookies"] = cookies
+
+
+    def checkin(self, session):
+        """
+        returns a session to the pool once its scraper is finished. Its connections stay open for the next session.
+        """
+
+        self.observe(session)
+        with self.lock:
+            self.adapters.append(session.get_adapter("https://"))
+        self.save()
+
+
+    def stats(self):
+        return {"solved": self.solved, "reused": self.reused}
+
+
+    def merge(self, stats):
+        """
+        adds the counters of the session pool of a worker process to this pool.
+        """
+
+        with self.lock:
+            self.solved += stats["solved"]
+            self.reused += stats["reused"]
+
+
+    def summary(self):
+        return f"{self.solved} Cloudflare challenges solved, {self.reused} clearances reused"
+
+
+## one session pool per process, shared by every scraper running in this process
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool(SESSION_FILE, SESSION_MAX_AGE)
+        return _pool
@@ -0,0 +1,80 @@
+import re
+
+from config import WEBSITES
+from dimensions import get_category_keys, get_store_keys
+from models import DailyData
+from writer import get_writer
+
+"""
+streaming sink that writes the products of every scraped page to the DailyData table while the scrape is still running.
+The Scraper class hands over every page as soon as it is certain that the page exists, and the sink hands the products
+over to the writer (see writer.py) in batches of a fixed size, so the memory usage doesn't grow with the size of the
+store's catalog and the rows of a store become visible to other jobs right away. Batches are upserted, so pages that are handed over again after a restart
+(see checkpoints.py) don't cause integrity errors.
+A product listed in several categories is written with the category that comes first in the config file, just like in
+Scraper.write_to_database, no matter in which order the pages of the categories arrive.
+"""
+
+
+class DailyDataSink:
+    """
+    buffers the products of the pages of a single store and writes them to the DailyData table in batches.
+
+    Args:
+    logger: the logger of the Application the scraper belongs to.
+    batch_size: the amount of products that are buffered before they are written to the database.
+    websites: the URLs of the categories in the order of the config file, which decides the category of products listed in several categories.
+    """
+
+    def __init__(self, logger, batch_size, websites=WEBSITES):
+        self.logger = logger
+        self.batch_size = batch_size
+        self.ranks = {re.sub(r"^https?://[^/]+/c/", "", website): rank for rank, website in enumerate(websites)}
+        self.buffer = {} # the buffered rows, keyed by their product ID
+        self.seen = {} # the rank of the category every product was written with during this run
+        self.written = 0
+        self.writer = get_writer()
+        self.store_keys = get_store_keys()
+        self.category_keys = get_category_keys()
+
+
+    def add(self, products):
+        """
+        normalizes the products of a page to the DailyData schema and writes them once the buffer is full.
+
+        Args:
+        products: the ProductBuffer of a page, labeled with the store and category names.
+        """
+
+        ## the store and category are the same for all products of a page, so they are only mapped once per page
+        rank = self.ranks.get(products.category, len(self.ranks))
+        products = products.relabel(store=self.store_keys.get(products.store), category=self.category_keys.get(products.category))
+        
+        ## a product that was already written with a later category is written again, the upsert replaces its category
+        for row in products.records():
+            if self.seen.get(row["product_id"], rank + 1) <= rank:
+                continue
+            self.seen[row["product_id"]] = rank
+            self.buffer[row["product_id"]] = row
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self):
+        """
+        hands all buffered products over to the writer (see writer.py) in batches.
+        """
+
+        rows, self.buffer = list(self.buffer.values()), {}
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            self.writer.submit(DailyData, batch)
+            self.logger.debug("handed %s products to the writer", len(batch))
+
+
+    def close(self):
+        self.flush()
+        self.writer.flush()
+        self.written = len(self.seen)
+        self.logger.info("%s products written to the DailyData table", self.written)
@@ -0,0 +1,410 @@
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import select
+
+import db_utils
+import models
+from config import SKETCH_K
+
+"""
+mergeable summaries of the prices of every date, store and category.
+The statistics in the DailyStatistics and CategoryStatistics tables (medians, quartiles, skewness, ...) can't be combined,
+so weekly, monthly or cross-store statistics would have to scan the raw prices of the DailyData table again.
+data_handler.py therefore also saves a PriceSummary of every date, store and category in the PriceSummaries table:
+the counts, minimum, maximum and the central moments of the prices (merged exactly), plus quantile sketches of all prices,
+of the prices of the products with a bio label and of the prices of the products that are not on offer (merged with a
+bounded error, see QuantileSketch). Any range of days, stores and categories is rolled up by merging their summaries,
+without reading a single DailyData row.
+
+usage:
+python summaries.py rollup [--period day|week|month|all] [--start DATE] [--end DATE] [--across-stores] [--across-categories] [--csv FILE]
+"""
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch. Keeps at most about 3 * k of the values it has seen, spread over levels whose values
+    stand for 2^level values each. The rank error of a quantile is about 1.7 / k of the amount of values, no matter how
+    many values or sketches were merged. Sketches of fewer than k values keep all values and are exact.
+
+    Args:
+    k: the size of the highest level. Higher values are more accurate but need more space.
+    levels: the values of every level, used to restore a saved sketch.
+    """
+
+    def __init__(self, k=SKETCH_K, levels=None):
+        self.k = k
+        self.levels = levels or [[]]
+        self.rng = random.Random(self.size())
+
+
+    @classmethod
+    def from_values(cls, values, k=SKETCH_K):
+        sketch = cls(k)
+        sketch.levels[0] = [float(value) for value in values if not math.isnan(value)]
+        sketch.compress()
+        return sketch
+
+
+    def size(self):
+        """
+        returns the amount of values the sketch stands for.
+        """
+
+        return sum(len(items) << level for level, items in enumerate(self.levels))
+
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+
+    def compress(self):
+        """
+        halves every level that is over its capacity by keeping every other of its sorted values
+        (starting at a random offset) on the next level.
+        """
+
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                leftover = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[self.rng.randint(0, 1)::2])
+                self.levels[level] = leftover
+            level += 1
+
+
+    def merge(self, other):
+        """
+        adds the values of another sketch to this sketch.
+        """
+
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.compress()
+        return self
+
+
+    def quantile(self, q):
+        """
+        returns the value at the given quantile, linearly interpolated between the closest values like pandas does.
+        Returns NaN if the sketch is empty.
+        """
+
+        items = sorted((value, 1 << level) for level, values in enumerate(self.levels) for value in values)
+        if not items:
+            return math.nan
+        position = q * (sum(weight for _, weight in items) - 1)
+        lower, upper = math.floor(position), math.ceil(position)
+        lower_value = upper_value = None
+        rank = 0
+        for value, weight in items:
+            if lower_value is None and lower < rank + weight:
+                lower_value = value
+            if upper < rank + weight:
+                upper_value = value
+                break
+            rank += weight
+        return lower_value + (upper_value - lower_value) * (position - lower)
+
+
+    def to_json(self):
+        return json.dumps({"k": self.k, "levels": self.levels})
+
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls(data["k"], data["levels"])
+
+
+class PriceSummary:
+    """
+    mergeable summary of the prices of a set of products: counts, minimum, maximum, mean and the sums of the squared and
+    cubed deviations from the mean (merged exactly), plus quantile sketches of all prices, the prices of the products
+    with a bio label and the prices of the products that are not on offer.
+    """
+
+    def __init__(self, total=0, bio=0, reduced=0, count=0, minimum=math.nan, maximum=math.nan, mean=0.0, m2=0.0, m3=0.0,
+                 sketch=None, bio_sketch=None, regular_sketch=None):
+        self.total = total # all products
+        self.bio = bio # products with a bio label
+        self.reduced = reduced # products on offer
+        self.count = count # products with a price
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = mean
+        self.m2 = m2
+        self.m3 = m3
+        self.sketch = sketch or QuantileSketch()
+        self.bio_sketch = bio_sketch or QuantileSketch()
+        self.regular_sketch = regular_sketch or QuantileSketch()
+
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        summarizes the products of a dataframe structured after the DailyData table.
+        """
+
+        prices = df["listed_price"].dropna()
+        deviations = prices - prices.mean() if len(prices) else prices
+        return cls(
+            total=len(df),
+            bio=int(df["has_bio_label"].sum()),
+            reduced=int(df["is_on_offer"].sum()),
+            count=len(prices),
+            minimum=float(prices.min()) if len(prices) else math.nan,
+            maximum=float(prices.max()) if len(prices) else math.nan,
+            mean=float(prices.mean()) if len(prices) else 0.0,
+            m2=float((deviations ** 2).sum()),
+            m3=float((deviations ** 3).sum()),
+            **cls.sketches_from_frame(df),
+        )
+
+
+    @staticmethod
+    def sketches_from_frame(df):
+        """
+        creates the quantile sketches of all prices, the prices of the products with a bio label and the prices of the 
+        products that are not on offer. Only needs the listed_price, has_bio_label and is_on_offer columns.
+        """
+
+        return {
+            "sketch": QuantileSketch.from_values(df["listed_price"]),
+            "bio_sketch": QuantileSketch.from_values(df.loc[df["has_bio_label"], "listed_price"]),
+            "regular_sketch": QuantileSketch.from_values(df.loc[~df["is_on_offer"], "listed_price"]),
+        }
+
+
+    def merge(self, other):
+        """
+        adds another summary to this summary. The moments are combined with the pairwise formulas of Chan and Pébay.
+        """
+
+        count = self.count + other.count
+        if count:
+            delta = other.mean - self.mean
+            self.m3 = (self.m3 + other.m3 + delta ** 3 * self.count * other.count * (self.count - other.count) / count ** 2
+                       + 3 * delta * (self.count * other.m2 - other.count * self.m2) / count)
+            self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+            self.mean = self.mean + delta * other.count / count
+            self.minimum = min(self.minimum, other.minimum) if self.count else other.minimum
+            self.maximum = max(self.maximum, other.maximum) if self.count else other.maximum
+        self.total += other.total
+        self.bio += other.bio
+        self.reduced += other.reduced
+        self.count = count
+        self.sketch.merge(other.sketch)
+        self.bio_sketch.merge(other.bio_sketch)
+        self.regular_sketch.merge(other.regular_sketch)
+        return self
+
+
+    def statistics(self):
+        """
+        calculates the data points of the CategoryStatistics table from the summary, rounded like in data_handler.py.
+        """
+
+        n = self.count
+        variance = self.m2 / (n - 1) if n > 1 else math.nan
+        if n < 3:
+            skewness = math.nan
+        elif self.m2 / n < 1e-14:
+            skewness = 0.0
+        else:
+            skewness = math.sqrt(n * (n - 1)) / (n - 2) * (self.m3 / n) / (self.m2 / n) ** 1.5
+        median = self.sketch.quantile(0.5)
+        quartile_1 = self.sketch.quantile(0.25)
+        quartile_3 = self.sketch.quantile(0.75)
+
+        return {
+            "price_min": round(self.minimum, 4),
+            "price_max": round(self.maximum, 4),
+            "price_mean": round(self.mean, 4) if n else math.nan,
+            "price_median": round(median, 4),
+            "price_skewness": round(skewness, 3),
+            "price_standard_deviation": round(math.sqrt(variance), 4),
+            "price_variance": round(variance, 4),
+            "price_range": round(self.maximum - self.minimum, 4),
+            "price_quartile_1": round(quartile_1, 4),
+            "price_quartile_3": round(quartile_3, 4),
+            "IQR": round(quartile_3 - quartile_1, 4),
+            "amount_total_products": self.total,
+            "amount_bio_products": self.bio,
+            "amount_reduced_products": self.reduced,
+            "percentage_bio_products": round(self.bio / self.total * 100, 4) if self.bio else 0,
+            "percentage_reduced_products": round(self.reduced / self.total * 100, 4) if self.reduced else 0,
+            "green_premium": round(self.bio_sketch.quantile(0.5) - median, 4) if self.bio else 0,
+            "average_savings": round(self.regular_sketch.quantile(0.5) - median, 4) if self.reduced else 0,
+        }
+
+
+    def to_record(self, date, store, category):
+        """
+        returns the summary as a row of the PriceSummaries table.
+        """
+
+        return {
+            "date": date,
+            "store_id": store,
+            "category_id": category,
+            "amount_total_products": self.total,
+            "amount_bio_products": self.bio,
+            "amount_reduced_products": self.reduced,
+            "price_count": self.count,
+            "price_min": None if math.isnan(self.minimum) else self.minimum,
+            "price_max": None if math.isnan(self.maximum) else self.maximum,
+            "price_mean": self.mean,
+            "price_m2": self.m2,
+            "price_m3": self.m3,
+            "price_sketch": self.sketch.to_json(),
+            "bio_price_sketch": self.bio_sketch.to_json(),
+            "regular_price_sketch": self.regular_sketch.to_json(),
+        }
+
+
+    @classmethod
+    def from_record(cls, row):
+        return cls(
+            total=row.amount_total_products,
+            bio=row.amount_bio_products,
+            reduced=row.amount_reduced_products,
+            count=row.price_count,
+            minimum=math.nan if row.price_min is None else row.price_min,
+            maximum=math.nan if row.price_max is None else row.price_max,
+            mean=row.price_mean,
+            m2=row.price_m2,
+            m3=row.price_m3,
+            sketch=QuantileSketch.from_json(row.price_sketch),
+            bio_sketch=QuantileSketch.from_json(row.bio_price_sketch),
+            regular_sketch=QuantileSketch.from_json(row.regular_price_sketch),
+        )
+
+
+def summarize(df):
+    """
+    summarizes the products of every date, store and category in a dataframe structured after the DailyData table.
+
+    Output:
+    a list of rows of the PriceSummaries table.
+    """
+
+    return [PriceSummary.from_frame(group).to_record(date, int(store), int(category))
+            for (date, store, category), group in df.groupby(["date", "store_id", "category_id"], observed=True)]
+
+
+def summarize_sketches(df):
+    """
+    creates only the quantile sketches of every date, store and category, e.g. if the counts and moments of the
+    summaries were calculated inside the database (see Handler.create_statistics_in_database in data_handler.py).
+
+    Args:
+    df: a dataframe with the date, store_id, category_id, listed_price, has_bio_label and is_on_offer columns of the DailyData table.
+
+    Output:
+    a list of rows of the PriceSummaries table with only their keys and sketches.
+    """
+
+    records = []
+    for (day, store, category), group in df.groupby(["date", "store_id", "category_id"], observed=True):
+        sketches = PriceSummary.sketches_from_frame(group)
+        records.append({
+            "date": day,
+            "store_id": int(store),
+            "category_id": int(category),
+            "price_sketch": sketches["sketch"].to_json(),
+            "bio_price_sketch": sketches["bio_sketch"].to_json(),
+            "regular_price_sketch": sketches["regular_sketch"].to_json(),
+        })
+    return records
+
+
+def period_start(day, period):
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    if period == "all":
+        return None
+    return day
+
+
+def rollup(start=None, end=None, period="week", across_stores=False, across_categories=False):
+    """
+    calculates the statistics of every period, store and category by merging the summaries of their days.
+
+    Args:
+    start, end: the first and last date to be rolled up (datetime.date), None for no limit.
+    period: "day", "week" (starting on Monday), "month" or "all" for the whole range.
+    across_stores: merges the summaries of all stores instead of calculating statistics per store.
+    across_categories: merges the summaries of all categories instead of calculating statistics per category.
+
+    Output:
+    a pandas dataframe with one row per period, store and category (store_id and category_id are None if merged across them)
+    and the data points of the CategoryStatistics table.
+    """
+
+    query = select(models.PriceSummaries)
+    if start is not None:
+        query = query.where(models.PriceSummaries.date >= start)
+    if end is not None:
+        query = query.where(models.PriceSummaries.date <= end)
+
+    summaries = {}
+    with db_utils.session_query() as session:
+        for row in session.execute(query).scalars():
+            key = (period_start(row.date, period),
+                   None if across_stores else row.store_id,
+                   None if across_categories else row.category_id)
+            summary = PriceSummary.from_record(row)
+            if key in summaries:
+                summaries[key].merge(summary)
+            else:
+                summaries[key] = summary
+
+    rows = [{"period": period_key, "store_id": store, "category_id": category, **summary.statistics()}
+            for (period_key, store, category), summary in summaries.items()]
+    return pd.DataFrame(rows).sort_values(["period", "store_id", "category_id"], na_position="first") if rows else pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rolls up the price summaries of the PriceSummaries table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rollups = subparsers.add_parser("rollup", help="calculate the statistics of weeks, months or all stores from the price summaries")
+    rollups.add_argument("--period", choices=["day", "week", "month", "all"], default="week")
+    rollups.add_argument("--start", type=date.fromisoformat, default=None, help="the first date, e.g. 2025-05-01")
+    rollups.add_argument("--end", type=date.fromisoformat, default=None, help="the last date, e.g. 2025-05-31")
+    rollups.add_argument("--across-stores", action="store_true", help="merge all stores instead of one row per store")
+    rollups.add_argument("--across-categories", action="store_true", help="merge all categories instead of one row per category")
+    rollups.add_argument("--csv", default=None, help="save the statistics to this CSV file instead of printing them")
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+    statistics = rollup(args.start, args.end, args.period, args.across_stores, args.across_categories)
+    seconds = time.perf_counter() - start
+    if statistics.empty:
+        sys.exit("no price summaries found")
+    if args.csv:
+        statistics.to_csv(args.csv, index=False)
+    else:
+        with pd.option_context("display.max_columns", None, "display.width", None):
+            print(statistics.to_string(index=False))
+    print(f"{len(statistics)} rows rolled up in {round(seconds * 1000, 1)} ms")
+
+
+if __name__ == "__main__":
+    main()
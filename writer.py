@@ -0,0 +1,252 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+
+import db_utils
+from config import WRITER_LINGER, WRITER_QUEUE_SIZE, WRITER_TRANSACTION_ROWS
+
+"""
+single writer for the ingestion of the scraped products.
+SQLite only allows one writer at a time, so instead of letting every scraper (and every worker process of the parallel mode)
+open its own write transaction, all batches are handed to a bounded queue that is emptied by a single writer thread in the
+main process. The writer groups the batches into transactions of up to WRITER_TRANSACTION_ROWS rows, so the write
+throughput doesn't depend on the amount of stores. If the writer falls behind, the queue fills up and the scrapers wait
+until there is room again, which keeps the memory usage flat.
+Worker processes of the parallel mode connect to the queue of the main process (see connect_writer), so their batches
+are written by the same thread.
+"""
+
+
+class WriterStats:
+    """
+    tracks the throughput of the writer, which will be documented in the logs file.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.transactions = 0
+        self.write_seconds = 0.0
+        self.blocked_seconds = 0.0 # time the scrapers of the main process waited for room in the queue
+
+
+    def summary(self):
+        rate = self.rows / self.write_seconds if self.write_seconds else 0.0
+        return (f"{self.rows} rows in {self.transactions} transactions, {rate:.0f} rows per second while writing, "
+                f"{self.blocked_seconds:.2f} seconds waited for the writer")
+
+
+class IngestionWriter:
+    """
+    writes the batches of all scrapers to the database from a single background thread.
+
+    Args:
+    batches: the queue the batches are handed over with. Either a queue.Queue, or the queue of a multiprocessing
+    manager if worker processes hand over batches as well.
+    logger: the logger of the Application.
+    transaction_rows: the amount of rows after which the collected batches are written in a transaction.
+    linger: seconds the writer waits for further batches before it writes a transaction that isn't full yet.
+    """
+
+    def __init__(self, batches, logger, transaction_rows=WRITER_TRANSACTION_ROWS, linger=WRITER_LINGER):
+        self.batches = batches
+        self.logger = logger
+        self.transaction_rows = transaction_rows
+        self.linger = linger
+        self.stats = WriterStats()
+        self.tokens = count(1)
+        self.flushed = 0 # the last flush token that was handled by the writer thread
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock() # held while a transaction is written, see paused
+        self.paused_by = None # the thread that holds the writer paused
+        self.close_requested = False # set if close is called by the thread that holds the writer paused
+        self.error = None
+        self.thread = None
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.write_batches, name="ingestion-writer", daemon=True)
+        self.thread.start()
+        return self
+
+
+    def submit(self, ORM, rows):
+        """
+        hands a batch of rows over to the writer. Waits if the queue is full.
+
+        Args:
+        ORM: SQLAlchemy ORM class of the table the rows are upserted into.
+        rows: list of dictionaries.
+        """
+
+        if self.error:
+            raise self.error
+        start = time.perf_counter()
+        self.batches.put(("rows", ORM, rows))
+        self.stats.blocked_seconds += time.perf_counter() - start
+
+
+    def flush(self):
+        """
+        waits until every batch handed over so far is written to the database.
+        Only has an effect in the process that runs the writer thread, worker processes return right away.
+        """
+
+        if self.thread is None:
+            return
+        token = next(self.tokens)
+        self.batches.put(("flush", token))
+        with self.condition:
+            self.condition.wait_for(lambda: self.flushed >= token or not self.thread.is_alive())
+        if self.error:
+            raise self.error
+
+
+    @contextmanager
+    def paused(self):
+        """
+        holds back all writes while the block is running, e.g. while another program writes to the database.
+        The batches handed over in the meantime stay in the queue. If the pausing thread calls close in the meantime
+        (e.g. from a signal handler), the writer is closed once the block is left.
+        """
+
+        try:
+            with self.write_lock:
+                self.paused_by = threading.get_ident()
+                try:
+                    yield
+                finally:
+                    self.paused_by = None
+        finally:
+            if self.close_requested:
+                self.close()
+
+
+    def write_batches(self):
+        """
+        runs in the background thread and writes the queued batches until close is called.
+        """
+
+        stop = False
+        while not stop:
+            pending = {} # the rows of every table, keyed by their primary key so the latest version of a row is written
+            rows = 0
+            token = None
+            batch = self.batches.get()
+            deadline = time.monotonic() + self.linger
+            while True:
+                if batch is None:
+                    stop = True
+                    break
+                if batch[0] == "flush":
+                    token = batch[1]
+                    break
+                _, ORM, batch_rows = batch
+                primary_keys = [col.name for col in ORM.__table__.primary_key.columns]
+                table_rows = pending.setdefault(ORM, {})
+                for row in batch_rows:
+                    table_rows[tuple(row[key] for key in primary_keys)] = row
+                rows += len(batch_rows)
+                if rows >= self.transaction_rows:
+                    break
+                try:
+                    batch = self.batches.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            ## the lock is only taken if there is something to write, so flushing or closing an idle writer never waits for a pause
+            if pending:
+                with self.write_lock:
+                    for ORM, table_rows in pending.items():
+                        try:
+                            written, seconds = db_utils.bulk_load(ORM, list(table_rows.values()))
+                        except Exception as e:
+                            self.logger.error(f"could not write {len(table_rows)} rows to {ORM.__tablename__}: {e}")
+                            self.error = e
+                            continue
+                        self.stats.rows += written
+                        self.stats.transactions += 1
+                        self.stats.write_seconds += seconds
+                        self.logger.debug("wrote %s rows to %s (%.0f rows/sec)", written, ORM.__tablename__, written / max(seconds, 1e-9))
+
+            if token is not None:
+                with self.condition:
+                    self.flushed = token
+                    self.condition.notify_all()
+
+        with self.condition:
+            self.condition.notify_all()
+
+
+    def close(self):
+        """
+        writes all queued batches and stops the writer thread.
+        If the calling thread holds the writer paused, the writer is closed once paused returns instead,
+        since the queued batches can't be written before.
+        """
+
+        if self.thread is None:
+            return
+        if self.paused_by == threading.get_ident():
+            self.close_requested = True
+            return
+        self.close_requested = False
+        self.batches.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.error:
+            raise self.error
+
+
+## one writer per process. The writer thread only runs in the main process, worker processes connect to its queue
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def start_writer(logger, batches=None):
+    """
+    starts the writer thread of this process.
+
+    Args:
+    logger: the logger of the Application.
+    batches: the queue of the writer, defaults to a new queue.Queue of WRITER_QUEUE_SIZE batches.
+    """
+
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = IngestionWriter(batches or queue.Queue(WRITER_QUEUE_SIZE), logger).start()
+        return _writer
+
+
+def connect_writer(batches):
+    """
+    connects a worker process to the queue of the writer in the main process.
+    """
+
+    global _writer
+    with _writer_lock:
+        _writer = IngestionWriter(batches, logging.getLogger(__name__))
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = IngestionWriter(queue.Queue(WRITER_QUEUE_SIZE), logging.getLogger(__name__)).start()
+        return _writer
+
+
+def close_writer():
+    """
+    writes all queued batches and stops the writer of this process.
+    """
+
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()